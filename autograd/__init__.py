@@ -14,6 +14,25 @@ from autograd.primitive_ops import sin
 from autograd.primitive_ops import sinh
 from autograd.primitive_ops import cos
 from autograd.primitive_ops import cosh
+from autograd.primitive_ops import transpose
+from autograd.primitive_ops import sum_to
+from autograd.primitive_ops import broadcast_to
+from autograd.primitive_ops import reshape
+from autograd.primitive_ops import step
 from autograd.ops_mixin import OperationsMixin
-from autograd.variable import Placeholder, Variable
+from autograd.variable import Constant, Placeholder, Variable
 from autograd.node import Node
+from autograd.session import Session
+from autograd.parallel import ParallelSession
+from autograd.batching import vmap
+from autograd.checkpoint import checkpoint
+from autograd.codegen import compile
+from autograd.forward_mode import jvp
+from autograd.forward_mode import jacobian
+from autograd.higher_order import hvp
+from autograd.distributed import DataParallel
+from autograd.optimizers import SGD
+from autograd.optimizers import Adam
+from autograd.optimizers import RMSProp
+from autograd.backend import no_grad
+from autograd.profiler import profile
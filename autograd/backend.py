@@ -1,16 +1,41 @@
-from logging import warn
+import functools
+import itertools
+import weakref
+
+import numpy as np
 
 
 AUTOMATIC_GRADIENT_RESET = True
 FLUSH_OLD_OPERATIONS = True
-
+# incremented on every leaf write, cached forward results
+# are only recomputed when an upstream leaf has a newer version
+GRAPH_VERSION = 0
+# bumped at the start of every backward pass and by the `reset_*_gradients`
+# functions, a gradient buffer is zero if it was last written at or before
+# the generation of the last reset of its kind
+GRADIENT_GENERATION = 1
+GRADIENTS_RESET = {'leaf': 0, 'node': 0}
+# disabled inside `no_grad`, operations are then computed eagerly without edges
+GRAD_ENABLED = True
+# `Node.instances` and `Leaf.instances` are only populated if enabled
+INSTANCE_TRACKING = False
+# the active `profiler.profile`, the forward and backward passes
+# only check it for None when nothing is being profiled
+PROFILER = None
+# the dtype of the leaves created without a dtype from python numbers,
+# lists and real arrays, see `set_default_dtype`
+DEFAULT_DTYPE = np.dtype(np.float32)
+# the gradients of half precision values are accumulated in it
+ACCUMULATION_DTYPE = np.dtype(np.float32)
+# shared by nodes and leaves to number them for their default names
+instance_counter = itertools.count(1)
 
 
 def enable_reset_gradients(state: bool):
+    """If disabled the gradients of every backward pass are added to the
+    previous ones until one of the `reset_*_gradients` functions is called"""
     if not isinstance(state, bool):
         raise ValueError(f'`state` should be an instance of `bool`. Recieved: {type(state)}')
-    if not state:
-        warn('`enable_reset_gradients` still not ready')
     global AUTOMATIC_GRADIENT_RESET
     AUTOMATIC_GRADIENT_RESET = state
 
@@ -20,43 +45,229 @@ def reset_gradient_enabled():
     return AUTOMATIC_GRADIENT_RESET
 
 
+def next_gradient_generation():
+    global GRADIENT_GENERATION
+    GRADIENT_GENERATION += 1
+    return GRADIENT_GENERATION
+
+
+def _reset_gradients(kind):
+    # O(1), the buffers are not touched until they are written again
+    GRADIENTS_RESET[kind] = GRADIENT_GENERATION
+    next_gradient_generation()
+
+
 def reset_intermediate_gradients():
-    warn('`reset_intermediate_gradients` still not ready')
-    from autograd.node import Node
-    for n in Node.instances.data:
-        n().gradients = 0.
+    _reset_gradients('node')
 
 
 def reset_leaf_gradients():
-    warn('`reset_leaf_gradients` still not ready')
-    from autograd.variable import Leaf
-    for n in Leaf.instances.data:
-        n().gradients = 0.
+    _reset_gradients('leaf')
 
 
 def reset_gradients():
-    warn('`reset_gradients` still not ready')
     reset_intermediate_gradients()
     reset_leaf_gradients()
 
 
+def grad_enabled():
+    global GRAD_ENABLED
+    return GRAD_ENABLED
+
+
+class no_grad:
+    """Context manager and decorator that disables building the graph,
+    operations created inside it are computed eagerly and keep only
+    their output without any references to their incoming nodes.
+
+    Example:
+        with autograd.no_grad():
+            prediction = model(x).data
+
+        @autograd.no_grad()
+        def predict(x):
+            return model(x).data
+    """
+
+    def __init__(self):
+        self._previous_states = []
+
+    def __enter__(self):
+        global GRAD_ENABLED
+        self._previous_states.append(GRAD_ENABLED)
+        GRAD_ENABLED = False
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        global GRAD_ENABLED
+        GRAD_ENABLED = self._previous_states.pop()
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self:
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def enable_instance_tracking(state: bool):
+    if not isinstance(state, bool):
+        raise ValueError(f'`state` should be an instance of `bool`. Recieved: {type(state)}')
+    global INSTANCE_TRACKING
+    INSTANCE_TRACKING = state
+
+
+def instance_tracking_enabled():
+    global INSTANCE_TRACKING
+    return INSTANCE_TRACKING
+
+
+def active_profiler():
+    global PROFILER
+    return PROFILER
+
+
+def set_profiler(profiler):
+    """Sets the active profiler and returns the previous one"""
+    global PROFILER
+    previous = PROFILER
+    PROFILER = profiler
+    return previous
+
+
+def default_dtype():
+    global DEFAULT_DTYPE
+    return DEFAULT_DTYPE
+
+
+def set_default_dtype(dtype):
+    """Sets the dtype of the leaves that are created without a dtype and
+    returns the previous one, e.g. `np.float16` stores half the memory of
+    float32 and the gradients are still accumulated in float32"""
+    dtype = np.dtype(dtype)
+    if dtype.kind != 'f':
+        raise ValueError(f'`dtype` should be a floating dtype. Recieved: {dtype}')
+    global DEFAULT_DTYPE
+    previous = DEFAULT_DTYPE
+    DEFAULT_DTYPE = dtype
+    return previous
+
+
+def as_array(data, dtype=None, copy=True):
+    """Converts `data` to an array of `dtype`, by default real data (numbers,
+    integer, boolean and floating arrays) takes the default dtype. Without
+    `copy` an array that already has the dtype is returned as it is"""
+    if dtype is None:
+        data = np.asarray(data)
+        dtype = DEFAULT_DTYPE if data.dtype.kind in 'biuf' else data.dtype
+    return np.array(data, dtype=dtype) if copy else np.asarray(data, dtype=dtype)
+
+
+def gradient_dtype(dtype):
+    """Returns the dtype that the gradients of values of `dtype` are accumulated in,
+    integer values get the default dtype and half precision values `ACCUMULATION_DTYPE`"""
+    if dtype is None:
+        return None
+    dtype = np.dtype(dtype)
+    if dtype.kind in 'biu':
+        dtype = DEFAULT_DTYPE
+    if dtype.kind == 'f' and dtype.itemsize < ACCUMULATION_DTYPE.itemsize:
+        return ACCUMULATION_DTYPE
+    return dtype
+
+
+def seed_gradients(gradients, output):
+    """Returns the gradients a backward pass starts from, python numbers take
+    the gradient dtype of `output` so they do not promote or demote the pass"""
+    if isinstance(gradients, (bool, int, float)):
+        return np.asarray(gradients, dtype=gradient_dtype(np.result_type(output)))
+    return gradients
+
+
+def graph_version():
+    global GRAPH_VERSION
+    return GRAPH_VERSION
+
+
+def bump_graph_version():
+    global GRAPH_VERSION
+    GRAPH_VERSION += 1
+    return GRAPH_VERSION
+
+
 def flatten(lists):
+    # iterative, a recursive closure would be a reference cycle on every call
     result = []
-    def _flatten(l):
-        for x in l:
+    stack = [iter(lists)]
+    while stack:
+        for x in stack[-1]:
             if isinstance(x, list):
-                _flatten(x)
-            else:
-                result.append(x)
-    _flatten(lists)
+                stack.append(iter(x))
+                break
+            result.append(x)
+        else:
+            stack.pop()
     return result
 
 
+def unbroadcast(gradients, shape):
+    """Sums `gradients` over the axes that were broadcast when an input of
+    `shape` was combined with other inputs, gradients that are smaller than
+    `shape` (e.g. the scalar seed of the output) are broadcast to it"""
+
+    if np.shape(gradients) == shape:
+        return gradients
+    gradients = np.asarray(gradients)
+    extra_axes = gradients.ndim - len(shape)
+    if extra_axes > 0:
+        gradients = gradients.sum(axis=tuple(range(extra_axes)))
+    if extra_axes >= 0:
+        axes = tuple(i for i, dim in enumerate(shape) if dim == 1 and gradients.shape[i] != 1)
+        if axes:
+            gradients = gradients.sum(axis=axes, keepdims=True)
+    if gradients.shape != shape:
+        gradients = np.broadcast_to(gradients, shape)
+    return gradients
+
+
+def append_weak_reference(references, obj):
+    """Appends a weak reference to `obj` to the `references` list (created if None).
+    Dead references are dropped when the list size reaches a power of two and at
+    most half of it is alive, so the list stays proportional to the live objects"""
+
+    if references is None:
+        return [weakref.ref(obj)]
+    size = len(references)
+    if size >= 8 and size & (size - 1) == 0:
+        alive = [ref for ref in references if ref() is not None]
+        if len(alive) <= size // 2:
+            references[:] = alive
+    references.append(weakref.ref(obj))
+    return references
+
+
+def live_references(references):
+    if references is None:
+        return []
+    return [obj for obj in (ref() for ref in references) if obj is not None]
+
+
 def reset_weights_graph(weights):
     for w in flatten(weights):
         w.outcoming_nodes = []
 
 
-def sgd_update(weights, lr=0.01):
-    for w in flatten(weights):
-        w._data += -lr * w.gradients
\ No newline at end of file
+def sgd_update(weights, lr=0.01, gradients=None):
+    """`gradients` are used instead of the `gradients` of the weights if passed,
+    in the same order as the flattened weights, e.g. gradients that were summed over workers.
+    `optimizers.SGD` updates all the weights at once from a flat parameter array"""
+    weights = flatten(weights)
+    if gradients is None:
+        gradients = [w._current_gradients() for w in weights]
+    for w, g in zip(weights, gradients):
+        if w._data.dtype.kind in 'fc':
+            # in place, the update is cast to the dtype of the weight, e.g. float32 gradients of float16 weights
+            w._data += -lr * g
+        else:
+            # integer weights can not hold the update, they take the dtype of their gradients
+            w._data = np.subtract(w._data, lr * g, dtype=gradient_dtype(w._data.dtype))
\ No newline at end of file
@@ -0,0 +1,227 @@
+import numpy as np
+
+from autograd import backend, primitive_ops
+from autograd.exceptions import NoPathFoundError
+from autograd.session import Session
+from autograd.variable import Placeholder
+
+
+def vmap(last_node, placeholders):
+    """Returns a `BatchedSession` that evaluates the graph which is defined
+    on the per-example `placeholders` over arrays that are stacked along a
+    leading batch axis, in one vectorized pass instead of one graph per example.
+
+    Example:
+        x = autograd.Placeholder()
+        w = autograd.Variable(np.ones((3, 2)))
+        out = autograd.sum(autograd.relu(autograd.matmul(x, w)))
+        batched = autograd.vmap(out, [x])
+        outputs = batched.run({x: np.ones((32, 3))})  # shape (32,)
+        outputs, (w_grad,) = batched.run({x: np.ones((32, 3))}, with_respect=[w])
+    """
+    return BatchedSession(last_node, placeholders)
+
+
+def _example_ndim(value, batched):
+    return np.ndim(value) - 1 if batched else np.ndim(value)
+
+
+def _align(inputs, flags, rank=None):
+    # inserts unit axes after the batch axis of the batched inputs,
+    # so that broadcasting lines up their per-example axes with the unbatched inputs
+    if rank is None:
+        rank = max(_example_ndim(value, batched) for value, batched in zip(inputs, flags))
+    aligned = []
+    for value, batched in zip(inputs, flags):
+        if batched:
+            value = np.asarray(value)
+            missing = rank - (value.ndim - 1)
+            if missing > 0:
+                value = value.reshape(value.shape[:1] + (1,) * missing + value.shape[1:])
+        aligned.append(value)
+    return aligned
+
+
+def _promote_matmul(inputs, flags):
+    # per-example vectors are turned into matrices so that the batch
+    # axis is treated as a stack axis by `np.matmul`
+    x, y = inputs
+    squeeze_x = _example_ndim(x, flags[0]) == 1
+    squeeze_y = _example_ndim(y, flags[1]) == 1
+    if squeeze_x:
+        x = np.expand_dims(x, -2)
+    if squeeze_y:
+        y = np.expand_dims(y, -1)
+    return _align((x, y), flags), squeeze_x, squeeze_y
+
+
+def _squeezed_axes(ndim, squeeze_x, squeeze_y):
+    axes = []
+    if squeeze_x:
+        axes.append(ndim - 2)
+    if squeeze_y:
+        axes.append(ndim - 1)
+    return tuple(axes)
+
+
+class BatchedSession(Session):
+    """A `Session` that runs the graph over a leading batch axis of the arrays
+    fed to `placeholders`, the other leaves are shared by all the examples.
+
+    Elementwise operations, `sum`, `matmul` and `dot` have batching rules,
+    any other operation falls back to a loop over the examples.
+    """
+
+    def __init__(self, last_node, placeholders):
+        # the batching rules are defined per operation of the graph
+        super().__init__(last_node, fuse=False, simplify=False)
+        self.placeholders = list(placeholders)
+        for placeholder in self.placeholders:
+            if not isinstance(placeholder, Placeholder) or placeholder not in self._slots:
+                raise ValueError(f"{placeholder} is not a placeholder of this graph.")
+        self._batched_slots = {self._slots[placeholder] for placeholder in self.placeholders}
+        self._slot_nodes = {self._slots[node]: node for node in self._nodes}
+
+    def run(self, feed_dict: dict = {}, with_respect=None, per_example=False):
+        """Runs the graph over the batch in `feed_dict` and returns the stacked
+        outputs, if `with_respect` is passed `(outputs, gradients)` is returned
+        where the gradients of the shared leaves are summed over the batch,
+        or kept for every example (with a leading batch axis) if `per_example` is True"""
+
+        for placeholder in feed_dict:
+            if not isinstance(placeholder, Placeholder) or placeholder not in self._slots:
+                raise ValueError(f"{placeholder} is not a placeholder of this graph.")
+
+        values = [None] * len(self._slots)
+        batched = [False] * len(self._slots)
+        batch_size = None
+        for slot, leaf in self._leaves:
+            if slot in self._batched_slots:
+                if leaf not in feed_dict:
+                    raise ValueError(f"{leaf} should be fed with a batch of examples.")
+                value = leaf.validate(feed_dict[leaf], batched=True)
+                if value.ndim == 0 or (batch_size is not None and value.shape[0] != batch_size):
+                    raise ValueError(f"Expected a batch of {batch_size} examples for {leaf}. Recieved shape: {value.shape}")
+                batch_size = value.shape[0]
+                batched[slot] = True
+            elif leaf in feed_dict:
+                value = leaf.validate(feed_dict[leaf])
+            else:
+                value = leaf.data
+            values[slot] = value
+
+        with_respect = self._with_respect(with_respect)
+        if with_respect is not None:
+            for var in with_respect:
+                if var not in self._slots:
+                    raise NoPathFoundError(f"Cannot create a graph for variable {var}")
+            if per_example:
+                # every example gets its own (broadcast, not copied) view of the
+                # shared leaves so their gradients keep the batch axis
+                for var in with_respect:
+                    slot = self._slots[var]
+                    if not batched[slot]:
+                        values[slot] = np.broadcast_to(values[slot], (batch_size,) + np.shape(values[slot]))
+                        batched[slot] = True
+
+        for node, (compute, input_slots, output_slot) in zip(self._nodes, self._forward_plan):
+            inputs = [values[i] for i in input_slots]
+            flags = [batched[i] for i in input_slots]
+            if any(flags):
+                values[output_slot] = self._batched_compute(node, inputs, flags, batch_size)
+                batched[output_slot] = True
+            else:
+                values[output_slot] = compute(*inputs)
+        output = values[self._output_slot]
+
+        if with_respect is None:
+            return output
+
+        gradients = [None] * len(values)
+        gradients[self._output_slot] = np.ones(np.shape(output), backend.gradient_dtype(np.result_type(output)))
+        for _, indices, input_slots, output_slot in self._backward_plan(with_respect):
+            node = self._slot_nodes[output_slot]
+            inputs = [values[i] for i in input_slots]
+            flags = [batched[i] for i in input_slots]
+            for index in indices:
+                input_slot = input_slots[index]
+                if any(flags):
+                    grads = self._batched_gradient(node, index, gradients[output_slot], inputs, flags, values[output_slot], batch_size)
+                else:
+                    grads = node.compute_gradient(index, gradients[output_slot], inputs, values[output_slot])
+                    grads = backend.unbroadcast(grads, np.shape(inputs[index]))
+                if gradients[input_slot] is None:
+                    gradients[input_slot] = grads
+                else:
+                    gradients[input_slot] = gradients[input_slot] + grads
+
+        return output, [gradients[self._slots[var]] for var in with_respect]
+
+    @staticmethod
+    def _rule(node, inputs, flags):
+        if isinstance(node, primitive_ops.sum):
+            return 'sum'
+        if isinstance(node, primitive_ops.matmul):
+            return 'matmul'
+        if isinstance(node, primitive_ops.dot):
+            ranks = [_example_ndim(value, batched) for value, batched in zip(inputs, flags)]
+            if 0 in ranks:
+                # `dot` with a scalar is a multiplication
+                return 'multiply'
+            if max(ranks) <= 2:
+                # and for vectors and matrices it is the same as `matmul`
+                return 'matmul'
+            return 'loop'
+        if node.elementwise:
+            return 'elementwise'
+        return 'loop'
+
+    def _batched_compute(self, node, inputs, flags, batch_size):
+        rule = self._rule(node, inputs, flags)
+        if rule == 'elementwise':
+            return node.compute(*_align(inputs, flags))
+        if rule == 'multiply':
+            return np.multiply(*_align(inputs, flags))
+        if rule == 'sum':
+            return np.sum(np.reshape(inputs[0], (batch_size, -1)), axis=1)
+        if rule == 'matmul':
+            (x, y), squeeze_x, squeeze_y = _promote_matmul(inputs, flags)
+            output = np.matmul(x, y)
+            axes = _squeezed_axes(output.ndim, squeeze_x, squeeze_y)
+            return np.squeeze(output, axes) if axes else output
+        return np.stack([
+            node.compute(*[value[b] if batched else value for value, batched in zip(inputs, flags)])
+            for b in range(batch_size)
+        ])
+
+    def _batched_gradient(self, node, index, gradients, inputs, flags, output, batch_size):
+        rule = self._rule(node, inputs, flags)
+        value, batched = inputs[index], flags[index]
+        if rule in ('elementwise', 'multiply', 'matmul'):
+            if rule == 'matmul':
+                aligned, squeeze_x, squeeze_y = _promote_matmul(inputs, flags)
+                axes = _squeezed_axes(np.ndim(gradients) + squeeze_x + squeeze_y, squeeze_x, squeeze_y)
+                if axes:
+                    gradients = np.expand_dims(gradients, axes)
+                    output = np.expand_dims(output, axes)
+                compute_gradient = primitive_ops.matmul.compute_gradient
+            else:
+                aligned = _align(inputs, flags)
+                compute_gradient = primitive_ops.multiply.compute_gradient if rule == 'multiply' else type(node).compute_gradient
+            grads = compute_gradient(node, index, gradients, aligned, output)
+            return np.reshape(backend.unbroadcast(grads, np.shape(aligned[index])), np.shape(value))
+
+        if rule == 'sum':
+            gradients = np.reshape(gradients, (batch_size,) + (1,) * (np.ndim(value) - 1))
+            return np.broadcast_to(gradients, np.shape(value))
+
+        grads = np.stack([
+            backend.unbroadcast(
+                node.compute_gradient(
+                    index, gradients[b],
+                    [v[b] if f else v for v, f in zip(inputs, flags)],
+                    output[b]),
+                np.shape(value[b] if batched else value))
+            for b in range(batch_size)
+        ])
+        return grads if batched else grads.sum(axis=0)
@@ -0,0 +1,146 @@
+import numpy as np
+
+from autograd import backend, forward_mode, primitive_ops
+from autograd.node import Node
+from autograd.ops_mixin import OperationsMixin
+from autograd.session import Session
+from autograd.variable import Constant, Leaf, Placeholder, Variable
+
+
+class checkpoint(Node):
+    """Runs the segment of the graph that `fn` builds from `inputs` without
+    keeping its interior values, the backward pass recomputes them from the
+    inputs of the segment. Splitting a chain of N operations into sqrt(N)
+    checkpoints keeps O(sqrt(N)) values alive for one more forward pass.
+
+    The leaves that `fn` uses without receiving them (e.g. weights) are
+    captured and get their gradients like the inputs.
+
+    Example:
+        def block(x):
+            return autograd.relu(autograd.matmul(x, w) + b)
+
+        h = x
+        for _ in range(depth):
+            h = autograd.checkpoint(block, h)
+        loss = autograd.sum(h)
+    """
+
+    __slots__ = ('fn', 'placeholders', 'captured', 'output_node', 'session', '_segment_gradients')
+
+    def __init__(self, fn, *inputs, **kwargs):
+        inputs = [x if isinstance(x, OperationsMixin) else Variable(x) for x in inputs]
+        # python numbers have their type instead of a dtype, see `Constant`
+        self.placeholders = [
+            Placeholder(shape=x.static_shape, dtype=None if isinstance(x.dtype, type) else x.dtype) for x in inputs]
+        self.fn = fn
+        # everything created before `fn` is called is outside of the segment
+        first_counter = next(backend.instance_counter)
+        self.output_node = fn(*self.placeholders)
+        self.captured = self._captured_leaves(self.output_node, first_counter)
+        self.session = Session(self.output_node, plan_memory=True)
+        self._segment_gradients = None
+        super().__init__(inputs + self.captured, **kwargs)
+
+    def _captured_leaves(self, output_node, first_counter):
+        captured = {}
+        placeholders = set(self.placeholders)
+        stack = [output_node]
+        visited = set()
+        while stack:
+            node = stack.pop()
+            if node in visited or node in placeholders:
+                continue
+            visited.add(node)
+            if isinstance(node, Constant):
+                # read by the inner session, e.g. a number used by `fn` before the checkpoint
+                continue
+            if node.counter < first_counter:
+                if not isinstance(node, Leaf):
+                    raise ValueError(f"{node} is used by the checkpointed function, pass it as an input instead.")
+                captured[node] = None
+            elif isinstance(node, Node):
+                stack.extend(node.incoming_nodes)
+                if node.nested:
+                    stack.append(node.get_output_node())
+        return list(captured)
+
+    def infer_shape(self, *input_shapes):
+        return self.output_node.static_shape
+
+    def infer_dtype(self, *input_dtypes):
+        return self.output_node.dtype
+
+    def _feed_dict(self, inputs):
+        # the captured placeholders of the outer graph are fed with their values too
+        placeholders = self.placeholders + self.captured
+        return {
+            placeholder: value for placeholder, value in zip(placeholders, inputs)
+            if isinstance(placeholder, Placeholder) and placeholder in self.session._slots
+        }
+
+    def compute(self, *inputs):
+        return self.session.run(self._feed_dict(inputs))
+
+    def compute_gradients(self, indices, gradients, inputs, output):
+        # the interior values are recomputed by running the segment again
+        leaves = self.placeholders + self.captured
+        with_respect = [leaves[index] for index in indices if leaves[index] in self.session._slots]
+        _, grads = self.session.run(
+            self._feed_dict(inputs), with_respect=with_respect, output_gradients=gradients, assign_gradients=False)
+        grads = dict(zip(with_respect, grads))
+        # an input that `fn` does not use has no gradients
+        return [
+            grads.get(leaves[index], np.zeros(np.shape(inputs[index]), backend.gradient_dtype(np.result_type(inputs[index]))))
+            for index in indices
+        ]
+
+    def compute_gradient(self, index, gradients, inputs, output):
+        # e.g. the examples of a `BatchedSession` that are looped over
+        return self.compute_gradients([index], gradients, inputs, output)[0]
+
+    def compute_tangent(self, tangents, inputs, output, batched=False):
+        # the segment is run again in forward mode with its placeholders fed, like `compute`
+        leaves = self.placeholders + self.captured
+        leaf_tangents = {
+            leaf: tangent for leaf, tangent in zip(leaves, tangents)
+            if tangent is not None and leaf in self.session._slots
+        }
+        if not leaf_tangents:
+            # the inputs with tangents are not used by `fn`
+            directions = next(len(tangent) for tangent in tangents if tangent is not None)
+            return np.zeros(((directions,) if batched else ()) + np.shape(output), np.result_type(output))
+        return forward_mode.jvp(self.output_node, leaf_tangents, self._feed_dict(inputs), batched)[1]
+
+    def gradient_node(self, index, gradients, inputs, output):
+        leaf = (self.placeholders + self.captured)[index]
+        if leaf not in self.session._slots:
+            return None
+        num_inputs = len(self.placeholders)
+
+        def vector_jacobian_product(*values):
+            # the gradients of the segment built again from the placeholders of a new checkpoint,
+            # so the gradient graph does not keep the interior values either
+            *values, grads = values
+            output_node = primitive_ops.sum(self.fn(*values) * grads)
+            with_respect = values[index] if index < num_inputs else inputs[index]
+            return output_node._gradient_graph([with_respect])[0]
+
+        return checkpoint(vector_jacobian_product, *inputs[:num_inputs], gradients)
+
+    def apply_backward(self, with_respect):
+        # the gradients of all the inputs are computed by one recomputation per pass,
+        # and they are dropped from `_segment_gradients` as soon as they are propagated
+        generation = backend.GRADIENT_GENERATION
+        if self._segment_gradients is None or self._segment_gradients[0] != generation:
+            inputs = [node.data for node in self.incoming_nodes]
+            indices = range(len(inputs))
+            grads = self.compute_gradients(indices, self._current_gradients(), inputs, None)
+            self._segment_gradients = (generation, dict(zip(indices, grads)))
+        segment_gradients = self._segment_gradients[1]
+        for index, node in enumerate(self.incoming_nodes):
+            if node is with_respect:
+                gradients = segment_gradients.pop(index)
+                with_respect._accumulate_gradients(backend.unbroadcast(gradients, np.shape(node.data)))
+        if not segment_gradients:
+            self._segment_gradients = None
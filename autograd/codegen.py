@@ -0,0 +1,203 @@
+import builtins
+import re
+
+import numpy as np
+
+from autograd import backend, session
+from autograd.exceptions import NoPathFoundError
+from autograd.variable import Placeholder
+
+# (signatures, leaf specs, slot shapes) -> (function, source), shared by the graphs of the same structure
+_functions = {}
+_NAME = re.compile(r'\b[vgt]\d+\b')
+
+
+def _spec(value):
+    if isinstance(value, np.ndarray):
+        return value.shape, value.dtype
+    return np.shape(value), np.result_type(value)
+
+
+class CompiledFunction:
+    """Runs the graph that ends at `output_node` as one generated Python function
+    of straight-line NumPy calls on local variables, see `compile`."""
+
+    def __init__(self, output_node, inputs=(), wrt=None, simplify=True):
+        graph = session.lower(output_node, simplify)
+        slots, leaves, folded = graph.slots, graph.leaves, graph.constants
+        self._instructions = graph.instructions
+        self._output_slot = graph.output_slot
+        self._ops = [op for op, _, _ in self._instructions]
+        # the slots of the values the generated function receives
+        self._leaf_slots = [slot for slot, _ in leaves] + [slot for slot, _ in folded]
+
+        positions = {leaf: position for position, (_, leaf) in enumerate(leaves)}
+        for x in inputs:
+            if x not in positions:
+                raise ValueError(f"{x} is not a leaf of this graph.")
+        self.inputs = list(inputs)
+        self._input_positions = [positions[x] for x in self.inputs]
+        # the leaves that are not inputs are read when the function is called, e.g. weights
+        self._fixed = [(position, leaf) for leaf, position in positions.items() if leaf not in self.inputs]
+        self._folded = [(len(leaves) + i, value) for i, (_, value) in enumerate(folded)]
+
+        if wrt is not None:
+            wrt = backend.flatten(wrt) if isinstance(wrt, (tuple, list)) else [wrt]
+            for var in wrt:
+                if var not in slots:
+                    raise NoPathFoundError(f"Cannot create a graph for variable {var}")
+                if slots[var] in graph.constant_slots:
+                    raise ValueError(f"{var} is folded or merged with other operations, compile with `simplify=False`.")
+        self.wrt = wrt
+        self._wrt_slots = None if wrt is None else [slots[var] for var in wrt]
+
+        self._structure = (
+            tuple((op.signature(), input_slots, output_slot) for op, input_slots, output_slot in self._instructions),
+            tuple(self._leaf_slots),
+            self._output_slot,
+            None if wrt is None else tuple(self._wrt_slots),
+        )
+        # leaf specs -> function, so a call only builds one key
+        self._functions = {}
+
+    def _leaf_values(self, values):
+        if len(values) != len(self.inputs):
+            raise TypeError(f"Expected {len(self.inputs)} inputs. Recieved: {len(values)}")
+        leaves = [None] * len(self._leaf_slots)
+        for position, leaf in self._fixed:
+            leaves[position] = leaf.data
+        for position, value in self._folded:
+            leaves[position] = value
+        for position, x, value in zip(self._input_positions, self.inputs, values):
+            leaves[position] = x.validate(value) if isinstance(x, Placeholder) else value
+        return leaves
+
+    def __call__(self, *values, output_gradients=1.0):
+        """Returns the output for the `values` of the inputs, and the gradients
+        of `wrt` as `(output, gradients)` if it was passed"""
+
+        leaves = self._leaf_values(values)
+        key = tuple(_spec(value) for value in leaves)
+        function = self._functions.get(key)
+        if function is None:
+            function = self._functions[key] = self._function(key, leaves)[0]
+        return function(leaves, self._ops, output_gradients)
+
+    def source(self, *values):
+        """Returns the generated source for the `values` of the inputs"""
+        leaves = self._leaf_values(values)
+        return self._function(tuple(_spec(value) for value in leaves), leaves)[1]
+
+    def _function(self, key, leaves):
+        # the shapes of the intermediate values are part of the code, and they
+        # are not given by the signatures, e.g. the output of a `checkpoint`
+        shapes = self._shapes(leaves)
+        cache_key = (self._structure, key, tuple(shapes.items()))
+        cached = _functions.get(cache_key)
+        if cached is None:
+            source = self._source(shapes)
+            namespace = {'np': np, '_unbroadcast': backend.unbroadcast, '_seed': backend.seed_gradients}
+            exec(builtins.compile(source, f'<autograd.compile {len(_functions)}>', 'exec'), namespace)
+            cached = _functions[cache_key] = (namespace['compiled'], source)
+        return cached
+
+    def _shapes(self, leaves):
+        # the code is specialized for the shapes, they are known by running the graph once
+        values = dict(zip(self._leaf_slots, leaves))
+        with np.errstate(all='ignore'):
+            for op, input_slots, output_slot in self._instructions:
+                values[output_slot] = op.compute(*[values[slot] for slot in input_slots])
+        return {slot: np.shape(value) for slot, value in values.items()}
+
+    def _source(self, shapes):
+        lines = [', '.join(f'v{slot}' for slot in self._leaf_slots) + ', = leaves' if self._leaf_slots else '']
+        for index, (op, _, slot) in enumerate(self._instructions):
+            # the operations are only loaded if their methods or attributes are used
+            templates = (op.forward_template, *(op.gradient_templates or (None,)))
+            if any(template is None or '{op}' in template for template in templates):
+                lines.append(f'o{slot} = ops[{index}]')
+
+        for op, input_slots, slot in self._instructions:
+            inputs = [f'v{input_slot}' for input_slot in input_slots]
+            if op.forward_template is None:
+                lines.append(f"v{slot} = o{slot}.compute({', '.join(inputs)})")
+            else:
+                lines.append(f"v{slot} = {op.forward_template.format(*inputs, op=f'o{slot}')}")
+
+        if self.wrt is None:
+            return self._function_source(lines, f'v{self._output_slot}')
+
+        needed = set(self._wrt_slots)
+        plan = []
+        for op, input_slots, slot in self._instructions:
+            indices = tuple(index for index, input_slot in enumerate(input_slots) if input_slot in needed)
+            if indices:
+                needed.add(slot)
+                plan.append((op, indices, input_slots, slot))
+
+        lines.append(f'g{self._output_slot} = np.broadcast_to(_seed(seed, v{self._output_slot}), {shapes[self._output_slot]!r})')
+        assigned = {self._output_slot}
+        for op, indices, input_slots, slot in reversed(plan):
+            inputs = [f'v{input_slot}' for input_slot in input_slots]
+            if op.gradient_templates is None:
+                lines.append(f"t{slot} = o{slot}.compute_gradients({indices!r}, g{slot}, ({', '.join(inputs)},), v{slot})")
+                expressions = [f'_unbroadcast(t{slot}[{k}], {shapes[input_slots[index]]!r})' for k, index in enumerate(indices)]
+            else:
+                expressions = []
+                for index in indices:
+                    expression = op.gradient_templates[index].format(*inputs, out=f'v{slot}', g=f'g{slot}', op=f'o{slot}')
+                    if shapes[input_slots[index]] != shapes[slot]:
+                        expression = f'_unbroadcast({expression}, {shapes[input_slots[index]]!r})'
+                    expressions.append(expression)
+            for index, expression in zip(indices, expressions):
+                input_slot = input_slots[index]
+                if input_slot in assigned:
+                    lines.append(f'g{input_slot} = g{input_slot} + {expression}')
+                else:
+                    lines.append(f'g{input_slot} = {expression}')
+                    assigned.add(input_slot)
+        # a leaf that the output does not depend on after the simplification has no gradients
+        gradients = ', '.join(f'g{slot}' if slot in assigned else 'None' for slot in self._wrt_slots)
+        return self._function_source(lines, f'v{self._output_slot}, [{gradients}]')
+
+    @staticmethod
+    def _function_source(lines, result):
+        # every intermediate is deleted after its last use, like the values released by a `Session`
+        returned = set(_NAME.findall(result))
+        last_uses = {}
+        for i, line in enumerate(lines):
+            for name in _NAME.findall(line.partition(' = ')[2]):
+                last_uses[name] = i
+        deletions = {}
+        for name, i in last_uses.items():
+            if name not in returned:
+                deletions.setdefault(i, []).append(name)
+
+        body = []
+        for i, line in enumerate(lines):
+            if line:
+                body.append(f'    {line}')
+            if i in deletions:
+                body.append(f"    del {', '.join(sorted(deletions[i]))}")
+        body.append(f'    return {result}')
+        return 'def compiled(leaves, ops, seed):\n' + '\n'.join(body) + '\n'
+
+
+def compile(output_node, inputs=(), wrt=None, simplify=True):
+    """Generates one Python function that runs the graph that ends at `output_node`
+    (and its backward pass if `wrt` is passed) as straight-line NumPy calls on local
+    variables, without going through the nodes. The operations are inlined from their
+    `forward_template` and `gradient_templates`, the others are called through their methods.
+
+    The returned function takes the values of `inputs` and reads the other leaves
+    (e.g. weights) when it is called, the code is generated once for every shape and
+    dtype of the leaves and shared by the graphs of the same structure. The graph is
+    simplified like in a `Session` unless `simplify` is False, see `simplification`.
+
+    Example:
+        x = autograd.Placeholder()
+        loss = autograd.sum(autograd.relu(autograd.matmul(x, w)))
+        step = autograd.compile(loss, inputs=[x], wrt=[w])
+        loss_value, (w_grad,) = step(x_batch)
+    """
+    return CompiledFunction(output_node, inputs, wrt, simplify)
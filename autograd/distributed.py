@@ -0,0 +1,174 @@
+import multiprocessing
+import os
+import traceback
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from autograd import backend
+from autograd.session import Session
+from autograd.variable import Placeholder
+
+# the arrays in a shared memory block start at multiples of this
+_ALIGNMENT = 64
+
+
+def _layout(arrays):
+    offsets = []
+    size = 0
+    for array in arrays:
+        offsets.append(size)
+        size += -(-array.nbytes // _ALIGNMENT) * _ALIGNMENT
+    return offsets, max(size, 1)
+
+
+def _views(buffer, arrays, offsets, base=0):
+    return [
+        np.ndarray(array.shape, dtype=array.dtype, buffer=buffer, offset=base + offset)
+        for array, offset in zip(arrays, offsets)
+    ]
+
+
+class DataParallel:
+    """Trains the graph that ends at `loss` on `num_workers` forked processes
+    (Linux), every worker runs the forward and backward pass on its shard of
+    the batch, the shards are split along the first axis of the values fed to
+    the placeholders.
+
+    The weights are moved to a shared memory block so the workers always see
+    the last update, the gradients of every worker are written to their own
+    shared memory block and summed by the main process before one `sgd_update`.
+    `loss` should be a sum over the examples so the summed gradients are the
+    gradients of the whole batch.
+
+    Example:
+        with DataParallel(loss, weights, num_workers=4) as trainer:
+            for x_batch, y_batch in batches:
+                loss_value = trainer.step({x: x_batch, y: y_batch}, lr=0.01)
+    """
+
+    def __init__(self, loss, weights, num_workers=None):
+        self.loss = loss
+        self.weights = backend.flatten(weights)
+        self.num_workers = num_workers or os.cpu_count()
+        # compiled before the fork, so every worker gets a copy
+        self._session = Session(loss)
+        # the shards are sent with the index of their placeholder, placeholders can not be pickled
+        self._placeholders = [leaf for _, leaf in self._session._leaves if isinstance(leaf, Placeholder)]
+
+        values = [np.ascontiguousarray(w.data) for w in self.weights]
+        offsets, size = _layout(values)
+        self._weights_memory = shared_memory.SharedMemory(create=True, size=size)
+        self._gradients_memory = shared_memory.SharedMemory(create=True, size=size * self.num_workers)
+        for w, value, view in zip(self.weights, values, _views(self._weights_memory.buf, values, offsets)):
+            view[...] = value
+            # the main process and the workers (after the fork) use the shared weights
+            w._data = view
+        self._gradients = [
+            _views(self._gradients_memory.buf, values, offsets, base=worker * size)
+            for worker in range(self.num_workers)
+        ]
+
+        context = multiprocessing.get_context('fork')
+        self._connections = []
+        self._workers = []
+        for worker in range(self.num_workers):
+            connection, worker_connection = context.Pipe()
+            process = context.Process(target=self._work, args=(worker, worker_connection), daemon=True)
+            process.start()
+            worker_connection.close()
+            self._connections.append(connection)
+            self._workers.append(process)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _work(self, worker, connection):
+        gradients = self._gradients[worker]
+        while True:
+            shard = connection.recv()
+            if shard is None:
+                break
+            try:
+                if shard:
+                    feed_dict = {self._placeholders[index]: value for index, value in shard.items()}
+                    loss, grads = self._session.run(feed_dict, with_respect=self.weights, assign_gradients=False)
+                    for view, g in zip(gradients, grads):
+                        np.copyto(view, g)
+                else:
+                    # an empty shard, e.g. a batch smaller than the number of workers
+                    loss = 0.
+                    for view in gradients:
+                        view.fill(0)
+                connection.send(('done', float(loss)))
+            except Exception:
+                connection.send(('error', traceback.format_exc()))
+        connection.close()
+
+    def _shards(self, feed_dict):
+        for placeholder in feed_dict:
+            if placeholder not in self._placeholders:
+                raise ValueError(f"{placeholder} is not a placeholder of this graph.")
+        splits = {
+            self._placeholders.index(placeholder): np.array_split(np.asarray(value), self.num_workers)
+            for placeholder, value in feed_dict.items()
+        }
+        return [
+            {index: split[worker] for index, split in splits.items()}
+            if all(len(split[worker]) for split in splits.values()) else {}
+            for worker in range(self.num_workers)
+        ]
+
+    def run(self, feed_dict):
+        """Returns the loss and the gradients of the weights summed over the workers"""
+
+        for connection, shard in zip(self._connections, self._shards(feed_dict)):
+            connection.send(shard)
+        loss = 0.
+        errors = []
+        for connection in self._connections:
+            status, result = connection.recv()
+            if status == 'error':
+                errors.append(result)
+            else:
+                loss += result
+        if errors:
+            raise RuntimeError(f"A worker failed:\n{errors[0]}")
+
+        # reduced by the main process, the workers read the updated weights from the shared block
+        gradients = [np.array(g) for g in self._gradients[0]]
+        for worker_gradients in self._gradients[1:]:
+            for total, g in zip(gradients, worker_gradients):
+                total += g
+        return loss, gradients
+
+    def step(self, feed_dict, lr=0.01):
+        """Runs the workers and updates the weights with the summed gradients, returns the loss"""
+
+        loss, gradients = self.run(feed_dict)
+        backend.sgd_update(self.weights, lr, gradients=gradients)
+        return loss
+
+    def close(self):
+        if not self._workers:
+            return
+        for connection in self._connections:
+            connection.send(None)
+            connection.close()
+        for process in self._workers:
+            process.join()
+        self._workers = []
+        # the weights keep their values after the shared memory is released
+        for w in self.weights:
+            w._data = np.array(w.data)
+        self._gradients = None
+        for memory in (self._weights_memory, self._gradients_memory):
+            memory.unlink()
+            try:
+                memory.close()
+            except BufferError:
+                # a view of the weights is still referenced, it is unmapped when it is collected
+                pass
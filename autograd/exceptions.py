@@ -6,3 +6,8 @@ class PlaceholderNotAssignedError(Exception):
 class NoPathFoundError(Exception):
     def __repr__(self) -> str:
         return "No Path Found Error"
+
+
+class ShapeError(ValueError):
+    def __repr__(self) -> str:
+        return "Shape Error"
@@ -0,0 +1,102 @@
+import numpy as np
+
+from autograd import backend
+from autograd.node import Node, resolve_composite
+from autograd.variable import Placeholder
+
+
+def _align(tangent, ndim):
+    # unit axes after the directions axis, so it does not broadcast with the axes of the values
+    missing = ndim - (tangent.ndim - 1)
+    if missing > 0:
+        return tangent.reshape(tangent.shape[:1] + (1,) * missing + tangent.shape[1:])
+    return tangent
+
+
+def jvp(output_node, tangents, feed_dict={}, batched=False):
+    """Computes the output of `output_node` and its directional derivative along
+    the `tangents` of the leaves (a dict from a leaf to an array of its shape, the other
+    leaves are constants) in one forward pass, the values are released as soon as the
+    operations that use them are computed. Returns `(output, output tangent)`.
+
+    With `batched=True` every tangent has a leading axis of directions and so does the
+    output tangent, e.g. the rows of an identity matrix give the Jacobian, see `jacobian`.
+
+    Example:
+        x = autograd.Variable(np.array([1., 2.]))
+        y = autograd.sin(x) * x
+        output, tangent = autograd.jvp(y, {x: np.array([1., 0.])})
+    """
+
+    output_node = resolve_composite(output_node)
+    if not isinstance(output_node, Node):
+        return output_node.data, tangents.get(output_node)
+    order = output_node._topological_order() + [output_node]
+    for placeholder in feed_dict:
+        if not isinstance(placeholder, Placeholder) or placeholder not in order:
+            raise ValueError(f"{placeholder} is not a placeholder of this graph.")
+
+    values = {}
+    node_tangents = {}
+    directions = None
+    for leaf, tangent in tangents.items():
+        if leaf not in order:
+            raise ValueError(f"{leaf} is not a leaf of this graph.")
+        tangent = np.asarray(tangent)
+        shape = tangent.shape[1:] if batched else tangent.shape
+        if shape != np.shape(feed_dict[leaf] if leaf in feed_dict else leaf.data):
+            raise ValueError(f"The tangent of {leaf} should have its shape. Recieved shape: {tangent.shape}")
+        if batched:
+            if directions is not None and len(tangent) != directions:
+                raise ValueError(f"Expected {directions} directions for {leaf}. Recieved: {len(tangent)}")
+            directions = len(tangent)
+        node_tangents[leaf] = tangent
+
+    # the number of operations that still have to read every value
+    remaining = {}
+    for node in order:
+        if isinstance(node, Node):
+            for i in node.incoming_nodes:
+                remaining[i] = remaining.get(i, 0) + 1
+
+    for node in order:
+        if not isinstance(node, Node) or not node.incoming_nodes:
+            values[node] = node.validate(feed_dict[node]) if node in feed_dict else node.data
+            continue
+        inputs = [values[i] for i in node.incoming_nodes]
+        output = node.compute(*inputs)
+        input_tangents = [node_tangents.get(i) for i in node.incoming_nodes]
+        if any(tangent is not None for tangent in input_tangents):
+            if batched and node.elementwise:
+                input_tangents = [None if tangent is None else _align(tangent, np.ndim(output)) for tangent in input_tangents]
+            tangent = node.compute_tangent(input_tangents, inputs, output, batched)
+            # e.g. the tangent of `x + c` has the shape of `x`
+            shape = (directions,) + np.shape(output) if batched else np.shape(output)
+            if np.shape(tangent) != shape:
+                tangent = np.broadcast_to(tangent, shape)
+            node_tangents[node] = tangent
+        values[node] = output
+        for i in node.incoming_nodes:
+            remaining[i] -= 1
+            if remaining[i] == 0:
+                values.pop(i, None)
+                node_tangents.pop(i, None)
+
+    output = values[output_node]
+    tangent = node_tangents.get(output_node)
+    if tangent is None:
+        # the output does not depend on the leaves
+        shape = ((directions,) if batched else ()) + np.shape(output)
+        tangent = np.zeros(shape, backend.gradient_dtype(np.result_type(output)))
+    return output, tangent
+
+
+def jacobian(output_node, leaf, feed_dict={}):
+    """Returns the Jacobian of `output_node` with respect to `leaf` of shape
+    `output shape + leaf shape` with one batched `jvp`, one direction per
+    element of the leaf, which suits leaves that are smaller than the output"""
+
+    value = np.asarray(feed_dict[leaf] if leaf in feed_dict else leaf.data)
+    directions = np.eye(value.size, dtype=backend.gradient_dtype(value.dtype)).reshape((value.size,) + value.shape)
+    _, tangent = jvp(output_node, {leaf: directions}, feed_dict, batched=True)
+    return np.moveaxis(tangent, 0, -1).reshape(np.shape(tangent)[1:] + value.shape)
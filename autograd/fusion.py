@@ -0,0 +1,150 @@
+import collections
+
+import numpy as np
+
+from autograd import backend
+
+
+def fuse_elementwise(instructions):
+    """Replaces every run of elementwise operations, where each operation is
+    the only user of the previous one, with one `FusedElementwise` instruction.
+
+    `instructions` is a topologically ordered list of `(node, input slots, output slot)`,
+    returns the new instructions and the output slots of the fused away operations
+    (they do not get a value anymore)."""
+
+    users = collections.Counter(slot for _, input_slots, _ in instructions for slot in input_slots)
+    # output slot of the last operation of a run -> the run
+    runs = {}
+    for node, input_slots, output_slot in instructions:
+        if not node.elementwise:
+            continue
+        run = []
+        for slot in input_slots:
+            if slot in runs and users[slot] == 1:
+                run = runs.pop(slot)
+                break
+        runs[output_slot] = run + [(node, input_slots, output_slot)]
+
+    fused = {run[-1][2]: run for run in runs.values() if len(run) > 1}
+    fused_slots = {output_slot for run in fused.values() for _, _, output_slot in run[:-1]}
+    new_instructions = []
+    for node, input_slots, output_slot in instructions:
+        if output_slot in fused_slots:
+            continue
+        if output_slot in fused:
+            new_instructions.append(FusedElementwise.from_run(fused[output_slot]))
+        else:
+            new_instructions.append((node, input_slots, output_slot))
+    return new_instructions, fused_slots
+
+
+def _dtype(value):
+    # python numbers do not promote the arrays, see `Node.infer_dtype`
+    return type(value) if isinstance(value, (bool, int, float, complex)) else np.result_type(value)
+
+
+class FusedElementwise:
+    """Runs a chain of elementwise operations in one instruction, the output of
+    the first one is allocated and the next ones write to it with `out=`
+    instead of allocating a temporary for every operation.
+
+    The intermediate outputs are not kept, `compute_gradients` recomputes them."""
+
+    supports_out = True
+    # the intermediates are recomputed from the inputs
+    gradient_uses_inputs = True
+    __slots__ = ('nodes', 'steps')
+
+    def __init__(self, nodes, steps):
+        self.nodes = nodes
+        # `(node, arguments)` where an argument is the index of an input
+        # of the instruction or None for the output of the previous step
+        self.steps = steps
+
+    @classmethod
+    def from_run(cls, run):
+        """Returns `(instruction, input slots, output slot)` for a run of
+        `(node, input slots, output slot)` from `fuse_elementwise`"""
+
+        input_slots = []
+        steps = []
+        previous_slot = None
+        for node, slots, output_slot in run:
+            arguments = []
+            for slot in slots:
+                if slot == previous_slot:
+                    arguments.append(None)
+                else:
+                    if slot not in input_slots:
+                        input_slots.append(slot)
+                    arguments.append(input_slots.index(slot))
+            steps.append((node, tuple(arguments)))
+            previous_slot = output_slot
+        return cls([node for node, _, _ in run], steps), tuple(input_slots), run[-1][2]
+
+    @property
+    def gradient_uses_output(self):
+        return self.nodes[-1].gradient_uses_output
+
+    @property
+    def dtype(self):
+        return self.nodes[-1].dtype
+
+    def _arguments(self, arguments, inputs, previous):
+        return [previous if argument is None else inputs[argument] for argument in arguments]
+
+    def infer_shape(self, *input_shapes):
+        shape = None
+        for node, arguments in self.steps:
+            shape = node.infer_shape(*self._arguments(arguments, input_shapes, shape))
+        return shape
+
+    def compute(self, *inputs, out=None):
+        buffer = out
+        for node, arguments in self.steps:
+            values = self._arguments(arguments, inputs, buffer)
+            # the buffer is only reused if it has the shape and dtype of the output,
+            # e.g. `power` with an array `p` can widen both
+            if isinstance(buffer, np.ndarray) and buffer.shape == node.infer_shape(*[np.shape(v) for v in values]) \
+                    and buffer.dtype == node.infer_dtype(*[_dtype(v) for v in values]):
+                try:
+                    buffer = node.compute(*values, out=buffer)
+                    continue
+                except TypeError:
+                    # the output can not be cast to the buffer, e.g. an integer buffer
+                    pass
+            buffer = node.compute(*values)
+        return buffer
+
+    def compute_gradients(self, indices, gradients, inputs, output):
+        needed = set(indices)
+        # the chain is only walked back to the first step that uses a needed input
+        first = min(i for i, (_, arguments) in enumerate(self.steps) if needed.intersection(arguments))
+
+        saved = []
+        previous = None
+        for i, (node, arguments) in enumerate(self.steps):
+            values = self._arguments(arguments, inputs, previous)
+            previous = output if i == len(self.steps) - 1 else node.compute(*values)
+            saved.append((values, previous))
+
+        grads = dict.fromkeys(indices)
+        for i in range(len(self.steps) - 1, first - 1, -1):
+            node, arguments = self.steps[i]
+            values, step_output = saved[i]
+            previous_gradients = None
+            for index, argument in enumerate(arguments):
+                if argument is None:
+                    if i > first:
+                        previous_gradients = backend.unbroadcast(
+                            node.compute_gradient(index, gradients, values, step_output), np.shape(values[index]))
+                elif argument in needed:
+                    g = backend.unbroadcast(
+                        node.compute_gradient(index, gradients, values, step_output), np.shape(values[index]))
+                    grads[argument] = g if grads[argument] is None else grads[argument] + g
+            gradients = previous_gradients
+        return [grads[index] for index in indices]
+
+    def __repr__(self):
+        return f"<FusedElementwise {' -> '.join(type(node).__name__ for node in self.nodes)}>"
@@ -0,0 +1,80 @@
+import numpy as np
+
+from autograd import backend
+
+
+class GradientsMixin:
+    """Gives nodes and leaves a persistent gradient buffer.
+
+    The buffer is reused across backward passes: the first contribution of a
+    pass is copied into it and the next ones are added in place, so zeroing
+    is lazy and only costs bumping `backend.GRADIENT_GENERATION`.
+    """
+
+    # `backend.reset_leaf_gradients` or `backend.reset_intermediate_gradients`
+    _gradients_kind = 'leaf'
+    __slots__ = ('_gradients', '_gradients_generation')
+
+    def _init_gradients(self):
+        self._gradients = None
+        self._gradients_generation = 0
+
+    def _gradients_dtype(self):
+        # e.g. float32 for float16 values, see `backend.gradient_dtype`
+        return backend.gradient_dtype(self.dtype)
+
+    def _has_gradients(self):
+        return self._gradients_generation > backend.GRADIENTS_RESET[self._gradients_kind]
+
+    def _current_gradients(self):
+        # the buffer itself, only read by the library
+        return self._gradients if self._has_gradients() else 0.
+
+    @property
+    def gradients(self):
+        """Returns the gradients of the last backward pass, or 0. if there are none.
+        They are a read-only view of the buffer that the next pass overwrites in
+        place, so they should be copied to be kept across passes"""
+        if not self._has_gradients():
+            return 0.
+        gradients = np.asarray(self._gradients).view()
+        gradients.flags.writeable = False
+        return gradients
+
+    @gradients.setter
+    def gradients(self, value):
+        buffer = self._gradients
+        try:
+            if buffer.shape != np.shape(value):
+                raise ValueError
+            np.copyto(buffer, value)
+        except (AttributeError, TypeError, ValueError):
+            # no buffer yet or `value` does not fit in it
+            self._gradients = np.array(value, dtype=self._gradients_dtype())
+        self._gradients_generation = backend.GRADIENT_GENERATION
+
+    def _accumulate_gradients(self, gradients):
+        generation = backend.GRADIENT_GENERATION
+        buffer = self._gradients
+        # intermediate gradients always start from zero, otherwise the
+        # previous passes would be propagated again to the leaves
+        if self._gradients_generation == generation or (
+                self._gradients_kind == 'leaf' and
+                not backend.reset_gradient_enabled() and self._has_gradients()):
+            if isinstance(buffer, np.ndarray) and buffer.shape == np.shape(gradients):
+                try:
+                    np.add(buffer, gradients, out=buffer)
+                    return
+                except TypeError:
+                    # e.g. float gradients can not be added in place to an integer buffer
+                    pass
+            self._gradients = np.add(buffer, gradients, dtype=self._gradients_dtype())
+        else:
+            # the first contribution of this pass overwrites the stale buffer
+            try:
+                if buffer.shape != np.shape(gradients):
+                    raise ValueError
+                np.copyto(buffer, gradients)
+            except (AttributeError, TypeError, ValueError):
+                self._gradients = np.array(gradients, dtype=self._gradients_dtype())
+        self._gradients_generation = generation
@@ -0,0 +1,49 @@
+import numpy as np
+
+from autograd import backend, primitive_ops
+from autograd.node import resolve_composite
+from autograd.session import Session
+from autograd.variable import Constant
+
+
+def hvp(output_node, params, vector):
+    """Returns the product of the Hessian of `output_node` with respect to `params`
+    and `vector` (an array of the shape of every parameter, a list if `params` is a list).
+
+    The gradients are built as a graph by `backward(create_graph=True)`, and the
+    gradients of their inner product with `vector` are the product, so it costs
+    about two backward passes instead of one pass per parameter.
+
+    Example:
+        w = autograd.Variable(np.array([1., 2.]))
+        loss = autograd.sum(autograd.sin(w) * w)
+        product = autograd.hvp(loss, w, np.array([1., 0.]))
+    """
+
+    single = not isinstance(params, (tuple, list))
+    params = [params] if single else backend.flatten(params)
+    vectors = [vector] if single else list(vector)
+    if len(vectors) != len(params):
+        raise ValueError(f"Expected {len(params)} vectors. Recieved: {len(vectors)}")
+
+    gradients = resolve_composite(output_node)._gradient_graph(params)
+    inner = None
+    for param, grads, v in zip(params, gradients, vectors):
+        v = np.asarray(v)
+        if v.shape != param.shape:
+            raise ValueError(f"The vector of {param} should have its shape. Recieved shape: {v.shape}")
+        term = primitive_ops.sum(grads * Constant(v))
+        inner = term if inner is None else inner + term
+
+    # the parameters that the gradients do not depend on have a zero product, e.g. `x * w` for `w`
+    reachable = set(inner._topological_order())
+    wrt = [param for param in params if param in reachable]
+    products = {}
+    if wrt:
+        _, grads = Session(inner).run(with_respect=wrt, assign_gradients=False)
+        products = dict(zip(wrt, grads))
+    products = [
+        np.zeros(param.shape, backend.gradient_dtype(param.dtype)) if param not in products else np.broadcast_to(products[param], param.shape)
+        for param in params
+    ]
+    return products[0] if single else products
@@ -0,0 +1,69 @@
+import sys
+
+import numpy as np
+
+
+def plan_liveness(instructions, backward_plan, output_slot):
+    """Returns the slots to release after every forward instruction and after
+    every backward instruction of `backward_plan` (None for a forward only run).
+
+    The outputs of the instructions are kept until their last use in the forward
+    unless a backward instruction reads their value, see `Node.gradient_uses_inputs`
+    and `Node.gradient_uses_output`, then they are kept until that instruction."""
+
+    owned = {slot for _, _, slot in instructions}
+    # the output is returned to the caller
+    owned.discard(output_slot)
+
+    last_backward_use = {}
+    for j, (op, _, input_slots, slot) in enumerate(backward_plan or ()):
+        used = input_slots if op.gradient_uses_inputs else ()
+        if op.gradient_uses_output:
+            used += (slot,)
+        for used_slot in used:
+            if used_slot in owned:
+                last_backward_use[used_slot] = j
+
+    last_forward_use = {}
+    for i, (_, input_slots, _) in enumerate(instructions):
+        for slot in input_slots:
+            last_forward_use[slot] = i
+
+    forward_releases = [[] for _ in instructions]
+    for slot, i in last_forward_use.items():
+        if slot in owned and slot not in last_backward_use:
+            forward_releases[i].append(slot)
+    backward_releases = [[] for _ in backward_plan or ()]
+    for slot, j in last_backward_use.items():
+        backward_releases[j].append(slot)
+    return forward_releases, backward_releases
+
+
+class BufferPool:
+    """Keeps the released arrays by shape and dtype so the next
+    operations that support `out` can write to them instead of allocating"""
+
+    def __init__(self, max_buffers):
+        # per shape and dtype
+        self.max_buffers = max_buffers
+        # only the shapes and dtypes that were asked for are kept,
+        # the other arrays are freed when they are released
+        self._buffers = {}
+
+    def take(self, shape, dtype):
+        buffers = self._buffers.setdefault((shape, dtype), [])
+        return buffers.pop() if buffers else None
+
+    def release(self, value):
+        # only arrays that own their memory and are not referenced anymore
+        # (e.g. by a view that is still in use) can be written to again,
+        # the references are the one of the caller, the argument and the one of `getrefcount`
+        if (type(value) is not np.ndarray or not value.flags.owndata
+                or not value.flags.writeable or sys.getrefcount(value) > 3):
+            return
+        buffers = self._buffers.get((value.shape, value.dtype))
+        if buffers is not None and len(buffers) < self.max_buffers:
+            buffers.append(value)
+
+    def clear(self):
+        self._buffers.clear()
@@ -1,140 +1,445 @@
-import abc
-import threading
 import weakref
 from typing import List, TypeVar, Union
 
-from autograd import backend
-from autograd.exceptions import NoPathFoundError
+import numpy as np
+
+from autograd import backend, shapes
+from autograd.exceptions import NoPathFoundError, ShapeError
+from autograd.gradients_mixin import GradientsMixin
 from autograd.ops_mixin import OperationsMixin
-from autograd.variable import Leaf, Variable
+from autograd.variable import Constant, Leaf, constant
 
 Node = TypeVar("Node", bound="Node")
 
 
-class Node(abc.ABC, OperationsMixin):
+def resolve_composite(node):
+    """Returns the operation that computes the output of `node`
+    if it is a composite operation like `sigmoid`, otherwise `node`"""
+    # leaves do not have `nested_nodes`
+    nested_nodes = getattr(node, 'nested_nodes', None)
+    while nested_nodes is not None:
+        node = nested_nodes[-1]
+        nested_nodes = getattr(node, 'nested_nodes', None)
+    return node
+
+
+class Node(GradientsMixin, OperationsMixin):
+    # only populated if `backend.enable_instance_tracking(True)` was called
     instances = weakref.WeakSet()
-    num_instances = 0
+    # operations that are applied element by element (with broadcasting)
+    elementwise = False
+    # whether the order of the inputs does not change the output
+    commutative = False
+    # whether the output only depends on the inputs, `simplification` merges
+    # these operations by their type, see `key`
+    stateless = False
+    # whether `compute_gradient` reads the values of the inputs or the output,
+    # otherwise only their shapes are used and a `Session` that plans
+    # its memory can release them before the backward pass
+    gradient_uses_inputs = True
+    gradient_uses_output = False
+    # whether `compute` accepts an `out` array to write the output to
+    supports_out = False
+    # the source of `compute` and of `compute_gradient` for every input that `codegen`
+    # inlines, `{0}`, `{1}`... are the inputs, `{out}` the output, `{g}` the gradients
+    # and `{op}` the operation, the methods are called if they are None
+    forward_template = None
+    gradient_templates = None
+    _gradients_kind = 'node'
+    # the output dtypes of the operations for the dtypes of their inputs
+    _dtypes = {}
+    __slots__ = (
+        'incoming_nodes', '_outcoming_nodes', 'nested_nodes',
+        'cached_graphs', 'counter', '_name', '_cached_data', '_cached_version',
+        '_version', '_version_checked', 'static_shape', 'dtype', '__weakref__',
+    )
 
     def __init__(self, incoming_nodes: List[Node] = [], name: str = None):
-        # incoming operations or variables
-        self.incoming_nodes = incoming_nodes
-        # outcoming operations or variables
-        self.outcoming_nodes = []
+        # incoming operations or variables, composite operations are inlined
+        # so the graph only contains the operations they are built from
+        self.incoming_nodes = [resolve_composite(node) for node in incoming_nodes]
+        # weak references to the outcoming operations, see `outcoming_nodes`
+        self._outcoming_nodes = None
         # for connecting nodes
         # caching gradients
-        self.gradients = 0.0
+        self._init_gradients()
+        # set by operations that are built from other operations, e.g. `sigmoid`
         self.nested_nodes = None
-        self.nested = False
-        self.cached_graphs = {}
-        Node.instances.add(self)
-        Node.num_instances += 1
-        self.counter = Node.num_instances
-        self._attach_to_outcoming_nodes()
-        
-        if name is None:
-            self.name = f'<{self.__class__.__name__.capitalize()}Operation{self.counter}>'
+        # created on the first traversal
+        self.cached_graphs = None
+        # memoized forward output and the version it was computed at
+        self._cached_data = None
+        self._cached_version = -1
+        self._version = 0
+        self._version_checked = -1
+        self.counter = next(backend.instance_counter)
+        # the default name is only formatted when it is requested
+        self._name = name
+        # inferred from the inputs without running the forward
+        try:
+            self._infer_static()
+        except ShapeError as e:
+            raise ShapeError(f"{self.name}: {e}") from None
+        if backend.grad_enabled():
+            self._attach_to_outcoming_nodes()
         else:
-            self.name = name
+            # inside `no_grad` the output is computed eagerly, so operations
+            # should set their own attributes before calling `Node.__init__`
+            self._cached_data = self.apply_forward()
+            self._cached_version = 0
+            self.incoming_nodes = []
 
-    def __setattr__(self, __name: str, __value: Node) -> None:
-        if isinstance(__value, Node):
-            if self.nested_nodes is None:
-                self.nested_nodes = []
-                self.nested = True
-            self.nested_nodes.append(__value)
-        return super().__setattr__(__name, __value)
+    @property
+    def name(self):
+        if self._name is None:
+            return f'<{self.__class__.__name__.capitalize()}Operation{self.counter}>'
+        return self._name
+
+    @name.setter
+    def name(self, name):
+        self._name = name
+
+    @property
+    def outcoming_nodes(self):
+        """Returns the operations that use this node and are still alive,
+        they are referenced weakly so a graph is released as soon as its
+        output is not referenced anymore"""
+        return backend.live_references(self._outcoming_nodes)
+
+    @outcoming_nodes.setter
+    def outcoming_nodes(self, nodes):
+        self._outcoming_nodes = [weakref.ref(node) for node in nodes] or None
+
+    @property
+    def nested(self):
+        return self.nested_nodes is not None
 
     @property
     def data(self):
         return self.forward()
 
+    @property
+    def version(self):
+        """Returns the latest version of the leaves this node depends on,
+        it is only recomputed if a leaf was written since the last check"""
+
+        current_version = backend.graph_version()
+        if self._version_checked != current_version:
+            self._version = max((node.version for node in self._dependencies()), default=0)
+            self._version_checked = current_version
+        return self._version
+
+    def _dependencies(self):
+        if self.nested:
+            return [self.get_output_node()]
+        return self.incoming_nodes
+
     @property
     def shape(self):
-        return self.data.shape
+        # only runs the forward if the static shape has dimensions that are known at run time
+        if shapes.is_static(self.static_shape):
+            return self.static_shape
+        return np.shape(self.data)
+
+    def _infer_static(self):
+        self.static_shape = self.infer_shape(*[node.static_shape for node in self.incoming_nodes])
+        self.dtype = self.infer_dtype(*[node.dtype for node in self.incoming_nodes])
 
     def get_output_node(self):
         return self.nested_nodes[-1] if self.nested else None
 
     def get_incoming_nodes(self) -> Union[List[Node], Node]:
-        """Returns incoming nodes and also checks
-        if an incoming node has nested nodes
-        so it can return the last nested node"""
+        """Returns incoming nodes, or the incoming node if there is only one,
+        composite incoming nodes are already replaced by their output node"""
+
+        if len(self.incoming_nodes) == 1:
+            return self.incoming_nodes[0]
+        return self.incoming_nodes
+
+
+    def _attach_to_outcoming_nodes(self):
+        for node in self.incoming_nodes:
+            node._outcoming_nodes = backend.append_weak_reference(node._outcoming_nodes, self)
+
+        if backend.instance_tracking_enabled():
+            Node.instances.add(self)
+
+    def compute(self, *inputs):
+        """Computes the output of the operation from the data of its incoming nodes,
+        operations with `supports_out` also accept an `out` array to write the output to"""
+        raise NotImplementedError(f"{self.__class__.__name__} does not implement `compute`")
+
+    def compute_gradient(self, index, gradients, inputs, output):
+        """Computes the gradients of the incoming node at `index`
+        given the gradients of this operation"""
+        raise NotImplementedError(f"{self.__class__.__name__} does not implement `compute_gradient`")
+
+    def gradient_node(self, index, gradients, inputs, output):
+        """Builds the gradients of the incoming node at `index` from the library's
+        operations for `backward(create_graph=True)`, `gradients`, `inputs` and
+        `output` are nodes. Returns None if the gradients are always zero"""
+        raise NotImplementedError(f"{self.__class__.__name__} does not implement `gradient_node`")
+
+    def compute_tangent(self, tangents, inputs, output, batched=False):
+        """Computes the tangent of the output from the `tangents` of the inputs for `jvp`,
+        a tangent is None if the input does not depend on the leaves, `batched` tangents
+        have a leading axis of directions (aligned with the output for elementwise operations)"""
+        raise NotImplementedError(f"{self.__class__.__name__} does not implement `compute_tangent`")
 
-        if len(self.incoming_nodes) > 1:
-            return self.incoming_nodes
+    def _tangent_per_direction(self, tangents, inputs, output):
+        # for the batched tangents that a rule does not vectorize
+        directions = next(len(tangent) for tangent in tangents if tangent is not None)
+        return np.stack([
+            self.compute_tangent([None if tangent is None else tangent[i] for tangent in tangents], inputs, output)
+            for i in range(directions)
+        ])
 
-        incoming_node = self.incoming_nodes[0]
-        if not len(self.incoming_nodes) == 1:
-            return self.incoming_nodes
+    def infer_shape(self, *input_shapes):
+        """Returns the static shape of the output, see `shapes`,
+        or None if the operation does not define it"""
+        if self.elementwise:
+            return shapes.broadcast_shapes(*input_shapes)
+        return None
 
-        if isinstance(incoming_node, Node) and incoming_node.nested:
-            return incoming_node.nested_nodes[-1]
+    def infer_dtype(self, *input_dtypes):
+        """Returns the dtype of the output by running `compute` on
+        one element arrays once for every combination of input dtypes"""
+        key = (type(self), input_dtypes)
+        try:
+            return Node._dtypes[key]
+        except KeyError:
+            pass
+        # `in` can not be used, a dtype compares equal to None (the default float dtype)
+        if any(dtype is None for dtype in input_dtypes):
+            dtype = None
         else:
-            return incoming_node
+            try:
+                with np.errstate(all='ignore'):
+                    # the python numbers of constants have their type instead of a dtype, see `Constant`
+                    dtype = np.result_type(self.compute(*[
+                        dtype(1) if isinstance(dtype, type) else np.ones(1, dtype) for dtype in input_dtypes]))
+            except (TypeError, ValueError, NotImplementedError):
+                # e.g. the operation needs inputs of a specific shape
+                dtype = None
+        Node._dtypes[key] = dtype
+        return dtype
 
+    def signature(self):
+        """Identifies the computation apart from the inputs, `codegen`
+        shares the generated code between graphs of the same signatures"""
+        return type(self)
 
-    def _attach_to_outcoming_nodes(self):
-        for node in self.incoming_nodes:
-            node.outcoming_nodes.append(self)
-            
-            if isinstance(node, Node):
-                Node.instances.add(node)
+    def key(self):
+        """Identifies the output given the inputs, `simplification` merges the operations
+        of equal keys over the same inputs, None if the operation should not be merged.
+        Operations with attributes that change the output include them, the others are
+        only merged if they are `stateless`"""
+        return type(self) if self.stateless else None
+
+    def compute_gradients(self, indices, gradients, inputs, output):
+        """Computes the gradients of the incoming nodes at `indices`"""
+        return [self.compute_gradient(index, gradients, inputs, output) for index in indices]
 
-    @abc.abstractmethod
     def apply_forward(self):
-        pass
+        return self.compute(*[node.data for node in self.incoming_nodes])
 
-    @abc.abstractmethod
     def apply_backward(self, with_respect):
-        pass
+        inputs = [node.data for node in self.incoming_nodes]
+        output = self.data
+        # an incoming node can appear more than once, e.g. `multiply(x, x)`
+        for index, node in enumerate(self.incoming_nodes):
+            if node is with_respect:
+                gradients = self.compute_gradient(index, self._current_gradients(), inputs, output)
+                with_respect._accumulate_gradients(backend.unbroadcast(gradients, np.shape(inputs[index])))
 
     def forward(self):
-        return self.apply_forward()
+        if self.nested:
+            return resolve_composite(self).forward()
+        if self._stale():
+            # refresh the stale upstream nodes in topological order first,
+            # so evaluating a node never recurses deeper than its inputs
+            for node in self._stale_nodes():
+                node._evaluate()
+        return self._cached_data
+
+    def _stale(self):
+        return self._version_checked != backend.graph_version() or self._cached_version != self._version
+
+    def _stale_nodes(self):
+        """Returns this node and the nodes it depends on whose output has to be
+        checked or recomputed, each one placed after its stale incoming nodes.
+        The walk stops at the nodes that are up to date, so evaluating the
+        new end of a graph whose other nodes were already evaluated is O(1)"""
+
+        order = []
+        visited = {self}
+        stack = [(self, iter(self.incoming_nodes))]
+        while stack:
+            node, inputs = stack[-1]
+            for i in inputs:
+                if i in visited or not isinstance(i, Node) or not i._stale():
+                    continue
+                visited.add(i)
+                stack.append((i, iter(i.incoming_nodes)))
+                break
+            else:
+                stack.pop()
+                order.append(node)
+        return order
 
-    def reset_gradients(self, nodes):
-        for node1, node2 in nodes:
-            node1.gradients = 0.0
-            node2.gradients = 0.0
+    def _evaluate(self):
+        version = self.version
+        if self._cached_version != version:
+            profiler = backend.PROFILER
+            if profiler is None:
+                self._cached_data = self.apply_forward()
+            else:
+                self._cached_data = profiler.apply_forward(self)
+            self._cached_version = version
+        return self._cached_data
+
+    def _topological_order(self):
+        """Returns every node and leaf this node depends on (excluding itself),
+        each one is placed after all of its incoming nodes.
+        The traversal is iterative so it does not depend on the
+        recursion limit, and it is cached since the incoming nodes
+        of a node never change after it is created"""
+
+        if self.cached_graphs is None:
+            self.cached_graphs = {}
+        order = self.cached_graphs.get(None)
+        if order is not None:
+            return order
+
+        order = []
+        visited = {self}
+        stack = [(self, iter(self.incoming_nodes))]
+        while stack:
+            node, inputs = stack[-1]
+            for i in inputs:
+                if i in visited:
+                    continue
+                visited.add(i)
+                if isinstance(i, Node):
+                    stack.append((i, iter(i.incoming_nodes)))
+                    break
+                order.append(i)
+            else:
+                stack.pop()
+                order.append(node)
+        # the node itself is left out so the cache does not reference its owner
+        order.pop()
+
+        self.cached_graphs[None] = order
+        return order
 
     def _build_graph_to_target_variable(self, with_respect):
-        path = []
-        not_variable_error_flag = True
-
-        def traverse(node):
-            nonlocal path, with_respect, not_variable_error_flag
-            for i in node.incoming_nodes:
-                if not isinstance(i, Leaf):
-                    traverse(i)
-                if ((isinstance(i, Leaf) and i is with_respect) or isinstance(i, Node)) and (node, i) not in path:
-                    if i is with_respect:
-                        not_variable_error_flag = False
-                    path.append((node, i))
-
-        traverse(self)
-        if not_variable_error_flag:
-            raise NoPathFoundError(f"Cannot create a graph for variable {with_respect}")
-        return path
-
-    def backward(self, with_respect):
-        if isinstance(with_respect, (tuple, list)):
+        """Returns the `(node, incoming_node)` edges that lead
+        to any of the `with_respect` leaves in topological order"""
+
+        order = self._topological_order()
+        key = tuple(with_respect)
+        cached = self.cached_graphs.get(key)
+        if cached is None:
+            reachable = set(order)
+            for var in with_respect:
+                if var not in reachable:
+                    raise NoPathFoundError(f"Cannot create a graph for variable {var}")
+
+            path = []
+            needed = set(with_respect)
+            for node in order:
+                if isinstance(node, Node):
+                    inputs = self._needed_inputs(node, needed)
+                    if inputs:
+                        needed.add(node)
+                        path.extend((node, i) for i in inputs)
+            # the edges of this node are added on every call to avoid a reference cycle
+            cached = self.cached_graphs[key] = (path, needed)
+
+        path, needed = cached
+        return path + [(self, i) for i in self._needed_inputs(self, needed)]
+
+    @staticmethod
+    def _needed_inputs(node, needed):
+        # `dict.fromkeys` drops repeated inputs, e.g. `multiply(x, x)`
+        return [i for i in dict.fromkeys(node.incoming_nodes) if i in needed]
+
+    def backward(self, with_respect=None, create_graph=False):
+        """Propagates the gradients from this node in one reverse pass,
+        if `with_respect` is None the gradients of every reachable leaf are computed.
+
+        With `create_graph=True` the gradients are built as a graph of operations,
+        see `gradient_node`, their values are assigned to the leaves and the gradient
+        nodes are returned (a list if `with_respect` is a list) so they can be
+        differentiated again, e.g. for Hessian-vector products, see `hvp`"""
+
+        if self.nested:
+            # composite operations are only a handle on their output node
+            return resolve_composite(self).backward(with_respect, create_graph)
+        if with_respect is None:
+            # constants never have gradients
+            variables = [n for n in self._topological_order() if isinstance(n, Leaf) and not isinstance(n, Constant)]
+        elif isinstance(with_respect, (tuple, list)):
+            variables = backend.flatten(with_respect)
+        else:
+            variables = [with_respect]
+        if create_graph:
+            gradients = self._gradient_graph(variables)
+            backend.next_gradient_generation()
+            for var, grads in zip(variables, gradients):
+                var._accumulate_gradients(grads.data)
+            return gradients if with_respect is None or isinstance(with_respect, (tuple, list)) else gradients[0]
+        if with_respect is None:
+            self._backward(variables)
+        elif isinstance(with_respect, (tuple, list)):
             self._multi_variable_backward(with_respect)
         else:
             self._single_variable_backward(with_respect)
-    
+
     def _single_variable_backward(self, with_respect):
-        path = self._build_graph_to_target_variable(with_respect)
-        self.cached_graphs[with_respect] = path
+        self._backward([with_respect])
+
+    def _multi_variable_backward(self, variables):
+        self._backward(backend.flatten(variables))
 
-        if backend.reset_gradient_enabled():
-            self.reset_gradients(path)
+    def _backward(self, variables):
+        path = self._build_graph_to_target_variable(variables)
 
-        self.gradients = 1.0
+        # the gradients of this pass start from zero without touching the
+        # nodes, stale buffers are overwritten by their first contribution
+        backend.next_gradient_generation()
+        self.gradients = backend.seed_gradients(1.0, self.data)
+        profiler = backend.PROFILER
         for most_recent_operation, prev_operation in reversed(path):
-            most_recent_operation.apply_backward(prev_operation)
+            if profiler is None:
+                most_recent_operation.apply_backward(prev_operation)
+            else:
+                profiler.apply_backward(most_recent_operation, prev_operation)
 
-    def _multi_variable_backward(self, variables):
-        for var in backend.flatten(variables):
-            self._single_variable_backward(var)
+    def _gradient_graph(self, variables):
+        """Returns the gradients of `variables` as nodes built by `gradient_node`,
+        the reverse pass of `_backward` over nodes instead of arrays"""
+
+        path = self._build_graph_to_target_variable(variables)
+        gradients = {self: constant(1.0)}
+        for most_recent_operation, prev_operation in reversed(path):
+            grads = gradients.get(most_recent_operation)
+            if grads is None:
+                # every gradient that reached this operation is zero
+                continue
+            inputs = most_recent_operation.incoming_nodes
+            for index, node in enumerate(inputs):
+                if node is prev_operation:
+                    contribution = most_recent_operation.gradient_node(index, grads, inputs, most_recent_operation)
+                    if contribution is not None:
+                        previous = gradients.get(node)
+                        gradients[node] = contribution if previous is None else previous + contribution
+        # the leaves that are only reached through operations of zero gradients, e.g. `step`
+        return [
+            Constant(np.zeros(var.shape, backend.gradient_dtype(var.dtype))) if gradients.get(var) is None else gradients[var]
+            for var in variables
+        ]
 
     def __repr__(self):
         return self.name
@@ -3,11 +3,13 @@ from autograd import primitive_ops, variable
 
 def check_input_type(func):
     def wrapper(self, x):
-        x = x if isinstance(x, OperationsMixin) else variable.Variable(x)
+        x = x if isinstance(x, OperationsMixin) else variable.constant(x)
         return func(self, x)
     return wrapper
 
 class OperationsMixin:
+    __slots__ = ()
+
     @check_input_type
     def __add__(self, x):
         return primitive_ops.add(self, x)
@@ -44,7 +46,7 @@ class OperationsMixin:
         return primitive_ops.power(self, x)
 
     def __neg__(self):
-        return primitive_ops.multiply(variable.Variable(-1), self)
+        return primitive_ops.multiply(variable.constant(-1), self)
 
     @check_input_type
     def add(self, x):
@@ -0,0 +1,174 @@
+import numpy as np
+
+from autograd import backend
+
+
+class ParameterStore:
+    """Packs the weights and their gradients into two contiguous flat arrays,
+    every weight's data and gradient buffer become views of them so an update
+    of the whole model is a few vectorized operations on the flat arrays."""
+
+    def __init__(self, weights):
+        self.weights = backend.flatten(weights)
+        # the weights keep their dtype, e.g. float16 weights are not promoted by
+        # float32 ones, integer weights take the floating dtype of the others
+        dtypes = {np.result_type(w.data) for w in self.weights}
+        floating = {dtype for dtype in dtypes if np.issubdtype(dtype, np.floating)}
+        if len(floating) > 1:
+            raise ValueError(
+                f"The weights have different dtypes {sorted(map(str, floating))}, create an optimizer for every dtype.")
+        dtype = floating.pop() if floating else backend.default_dtype()
+        self.slices = []
+        offset = 0
+        for w in self.weights:
+            self.slices.append(slice(offset, offset + np.size(w.data)))
+            offset += np.size(w.data)
+        self.params = np.empty(offset, dtype=dtype)
+        # e.g. float32 gradients for float16 weights, see `backend.gradient_dtype`
+        self.grads = np.zeros(offset, dtype=backend.gradient_dtype(dtype))
+        self._param_views = []
+        self._grad_views = []
+        for w, s in zip(self.weights, self.slices):
+            shape = np.shape(w.data)
+            param_view = self.params[s].reshape(shape)
+            param_view[...] = w.data
+            w._data = param_view
+            # the backward pass writes the gradients directly to the flat array,
+            # see `GradientsMixin._accumulate_gradients`
+            grad_view = self.grads[s].reshape(shape)
+            w._gradients = grad_view
+            w._gradients_generation = 0
+            self._param_views.append(param_view)
+            self._grad_views.append(grad_view)
+
+    def gather_params(self):
+        """Packs the data of the weights that was replaced since they were packed
+        (e.g. reloaded weights) into `params` again, so it is the data that is updated"""
+
+        for w, view in zip(self.weights, self._param_views):
+            if w._data is not view:
+                if np.shape(w._data) != view.shape:
+                    raise ValueError(f"{w} was assigned a value of shape {np.shape(w._data)}, expected {view.shape}.")
+                view[...] = w._data
+                w._data = view
+
+    def gather_gradients(self, gradients=None):
+        """Returns the flat gradients, `gradients` (in the order of the weights)
+        are used instead of the gradients of the weights if passed"""
+
+        if gradients is None:
+            gradients = [w._current_gradients() for w in self.weights]
+        for view, g in zip(self._grad_views, gradients):
+            # stale gradients are 0. and a gradient buffer is replaced if a gradient
+            # does not fit in it, e.g. it was assigned with a different shape
+            if g is not view:
+                view[...] = g
+        return self.grads
+
+    def mark_updated(self):
+        # the weights were written in place through `params`,
+        # so their cached outputs have to be invalidated
+        version = backend.bump_graph_version()
+        for w in self.weights:
+            w.version = version
+
+
+class Optimizer:
+    """Updates `weights` from their gradients after every backward pass.
+
+    `weight_decay` adds `weight_decay * w` to the gradients and `clip_norm`
+    rescales the gradients of the whole model when their norm is larger.
+
+    Example:
+        optimizer = autograd.Adam([w, b], lr=1e-3, clip_norm=1.0)
+        for batch in batches:
+            loss.backward([w, b])
+            optimizer.step()
+    """
+
+    def __init__(self, weights, lr, weight_decay=0., clip_norm=None):
+        self.store = ParameterStore(weights)
+        self.lr = lr
+        self.weight_decay = weight_decay
+        self.clip_norm = clip_norm
+        # the gradients are transformed in it, so the gradients of the weights are not changed
+        self._buffer = np.empty_like(self.store.grads)
+
+    @property
+    def weights(self):
+        return self.store.weights
+
+    def step(self, gradients=None):
+        """`gradients` are used instead of the gradients of the weights if passed,
+        e.g. the summed gradients of `DataParallel.run`"""
+
+        self.store.gather_params()
+        g = self.store.gather_gradients(gradients)
+        if self.weight_decay:
+            g = np.multiply(self.store.params, self.weight_decay, out=self._buffer)
+            g += self.store.grads
+        if self.clip_norm is not None:
+            norm = np.sqrt(np.dot(g, g))
+            if norm > self.clip_norm:
+                g = np.multiply(g, self.clip_norm / norm, out=self._buffer)
+        self.update(self.store.params, g)
+        self.store.mark_updated()
+
+    def update(self, params, gradients):
+        """Updates the flat `params` in place"""
+        raise NotImplementedError(f"{self.__class__.__name__} does not implement `update`")
+
+
+class SGD(Optimizer):
+    def __init__(self, weights, lr=0.01, momentum=0., nesterov=False, **kwargs):
+        super().__init__(weights, lr, **kwargs)
+        self.momentum = momentum
+        self.nesterov = nesterov
+        self.velocity = np.zeros_like(self.store.grads) if momentum else None
+
+    def update(self, params, gradients):
+        if not self.momentum:
+            params -= self.lr * gradients
+            return
+        velocity = self.velocity
+        velocity *= self.momentum
+        velocity += gradients
+        if self.nesterov:
+            params -= self.lr * (gradients + self.momentum * velocity)
+        else:
+            params -= self.lr * velocity
+
+
+class Adam(Optimizer):
+    def __init__(self, weights, lr=0.001, beta1=0.9, beta2=0.999, eps=1e-8, **kwargs):
+        super().__init__(weights, lr, **kwargs)
+        self.beta1 = beta1
+        self.beta2 = beta2
+        self.eps = eps
+        self.m = np.zeros_like(self.store.grads)
+        self.v = np.zeros_like(self.store.grads)
+        self.t = 0
+
+    def update(self, params, gradients):
+        self.t += 1
+        self.m *= self.beta1
+        self.m += (1 - self.beta1) * gradients
+        self.v *= self.beta2
+        self.v += (1 - self.beta2) * np.square(gradients)
+        # the bias corrections are folded into the learning rate and epsilon
+        lr = self.lr * np.sqrt(1 - self.beta2 ** self.t) / (1 - self.beta1 ** self.t)
+        eps = self.eps * np.sqrt(1 - self.beta2 ** self.t)
+        params -= lr * self.m / (np.sqrt(self.v) + eps)
+
+
+class RMSProp(Optimizer):
+    def __init__(self, weights, lr=0.01, rho=0.9, eps=1e-8, **kwargs):
+        super().__init__(weights, lr, **kwargs)
+        self.rho = rho
+        self.eps = eps
+        self.mean_square = np.zeros_like(self.store.grads)
+
+    def update(self, params, gradients):
+        self.mean_square *= self.rho
+        self.mean_square += (1 - self.rho) * np.square(gradients)
+        params -= self.lr * gradients / (np.sqrt(self.mean_square) + self.eps)
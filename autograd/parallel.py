@@ -0,0 +1,107 @@
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from autograd.session import Session
+
+
+class ParallelSession(Session):
+    """A `Session` that runs the instructions whose inputs are ready on a thread
+    pool, so independent branches (e.g. the neurons of a layer) run at the same time.
+    NumPy releases the GIL in large ufuncs and BLAS calls, so this pays off for
+    wide graphs of large arrays, small operations are faster in a `Session`.
+
+    Example:
+        with ParallelSession(loss, max_workers=4) as session:
+            loss_value, gradients = session.run({x: batch}, with_respect=weights)
+    """
+
+    def __init__(self, last_node, max_workers=None, fuse=True, simplify=True):
+        super().__init__(last_node, fuse=fuse, simplify=simplify)
+        self._executor = ThreadPoolExecutor(max_workers)
+        # guards the gradients that several instructions add to
+        self._lock = threading.Lock()
+        producers = {output_slot: i for i, (_, _, output_slot) in enumerate(self._instructions)}
+        self._forward_dependents = [[] for _ in self._instructions]
+        self._forward_dependencies = []
+        for i, (_, input_slots, _) in enumerate(self._instructions):
+            dependencies = {producers[slot] for slot in input_slots if slot in producers}
+            for dependency in dependencies:
+                self._forward_dependents[dependency].append(i)
+            self._forward_dependencies.append(len(dependencies))
+        self._backward_graphs = {}
+
+    def _backward_graph(self, plan):
+        # an instruction of the backward pass runs once all the gradients of its output are added
+        key = id(plan)
+        graph = self._backward_graphs.get(key)
+        if graph is None:
+            producers = {output_slot: j for j, (_, _, _, output_slot) in enumerate(plan)}
+            dependents = [[] for _ in plan]
+            dependencies = [0] * len(plan)
+            for j, (_, indices, input_slots, _) in enumerate(plan):
+                for index in indices:
+                    k = producers.get(input_slots[index])
+                    if k is not None:
+                        dependents[j].append(k)
+                        dependencies[k] += 1
+            graph = self._backward_graphs[key] = (dependents, dependencies)
+        return graph
+
+    def _schedule(self, task, dependents, dependencies):
+        """Calls `task(i)` for every instruction once all the instructions
+        it depends on are done, the counting is done by the calling thread"""
+
+        remaining = list(dependencies)
+        ready = [i for i, count in enumerate(remaining) if count == 0]
+        running = {}
+        try:
+            while ready or running:
+                for i in ready:
+                    running[self._executor.submit(task, i)] = i
+                ready = []
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i = running.pop(future)
+                    future.result()
+                    for dependent in dependents[i]:
+                        remaining[dependent] -= 1
+                        if remaining[dependent] == 0:
+                            ready.append(dependent)
+        except BaseException:
+            # the running instructions still write to the values
+            wait(running)
+            raise
+
+    def run(self, feed_dict: dict = {}, with_respect=None, output_gradients=1.0, assign_gradients=True):
+        with_respect = self._with_respect(with_respect)
+
+        values = [None] * len(self._slots)
+        self._feed(values, feed_dict)
+
+        def forward(i):
+            op, input_slots, output_slot = self._instructions[i]
+            values[output_slot] = self._apply(op, [values[slot] for slot in input_slots])
+
+        self._schedule(forward, self._forward_dependents, self._forward_dependencies)
+        output = values[self._output_slot]
+
+        if with_respect is None:
+            return output
+
+        plan = self._backward_plan(with_respect)
+        gradients = self._seed(values, output_gradients)
+
+        def backward(j):
+            op, indices, input_slots, output_slot = plan[j]
+            inputs = [values[slot] for slot in input_slots]
+            op_gradients = self._input_gradients(op, indices, gradients[output_slot], inputs, values[output_slot])
+            gradients[output_slot] = None
+            with self._lock:
+                self._add_gradients(gradients, indices, input_slots, op_gradients)
+
+        self._schedule(backward, *self._backward_graph(plan))
+        return output, self._results(gradients, with_respect, assign_gradients)
+
+    def close(self):
+        super().close()
+        self._executor.shutdown()
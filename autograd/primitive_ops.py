@@ -1,259 +1,744 @@
 import numpy as np
 
-import autograd
-from autograd import variable
+from autograd import backend, shapes, variable
 from autograd.node import Node
 
 
+def _add_tangents(*tangents):
+    # None is the tangent of an input that does not depend on the leaves of `jvp`
+    total = None
+    for tangent in tangents:
+        if tangent is not None:
+            total = tangent if total is None else total + tangent
+    return total
+
+
+def _sum_to(gradients, like):
+    # the gradient nodes are summed over the axes that were broadcast, like `backend.unbroadcast`
+    shape = like.shape
+    return gradients if gradients.shape == shape else sum_to(gradients, shape)
+
+
+def _broadcast_like(gradients, output):
+    # the seed of `backward(create_graph=True)` is a scalar
+    shape = output.shape
+    return gradients if gradients.shape == shape else broadcast_to(gradients, shape)
+
+
+def _swap_last_axes(x):
+    ndim = len(x.shape)
+    return transpose(x, list(range(ndim - 2)) + [ndim - 1, ndim - 2])
+
+
+def _matmul_gradient_node(index, gradients, x, y):
+    # 1-D operands are promoted to matrices like `np.matmul` does, and
+    # the gradients of the promoted operand are reshaped back
+    x_shape, y_shape = x.shape, y.shape
+    if len(x_shape) == 1 and len(y_shape) == 1:
+        return (y if index == 0 else x) * gradients
+    if len(y_shape) == 1:
+        y = reshape(y, y_shape + (1,))
+        gradients = reshape(gradients, gradients.shape + (1,))
+    if len(x_shape) == 1:
+        x = reshape(x, (1,) + x_shape)
+        gradients = reshape(gradients, gradients.shape[:-1] + (1,) + gradients.shape[-1:])
+    if index == 0:
+        grads = _sum_to(matmul(gradients, _swap_last_axes(y)), x)
+        return reshape(grads, x_shape) if len(x_shape) == 1 else grads
+    grads = _sum_to(matmul(_swap_last_axes(x), gradients), y)
+    return reshape(grads, y_shape) if len(y_shape) == 1 else grads
+
+
 class add(Node):
+    elementwise = True
+    commutative = True
+    supports_out = True
+    gradient_uses_inputs = False
+    forward_template = 'np.add({0}, {1})'
+    gradient_templates = ('{g}', '{g}')
+    stateless = True
+    __slots__ = ()
+
     def __init__(self, x, y, **kwargs):
         super(add, self).__init__([x, y], **kwargs)
 
-    def apply_forward(self):
-        x, y = self.get_incoming_nodes()
-        output = np.add(x.data, y.data)
-        return output
+    def compute(self, x, y, out=None):
+        return np.add(x, y, out=out)
+
+    def compute_gradient(self, index, gradients, inputs, output):
+        return gradients
+
+    def gradient_node(self, index, gradients, inputs, output):
+        return _sum_to(gradients, inputs[index])
 
-    def apply_backward(self, with_respect):
-        with_respect.gradients += np.ones(with_respect.shape) * self.gradients
-        return variable.Variable(with_respect.gradients)
+    def compute_tangent(self, tangents, inputs, output, batched=False):
+        return _add_tangents(*tangents)
 
 
 class subtract(Node):
+    elementwise = True
+    supports_out = True
+    gradient_uses_inputs = False
+    forward_template = 'np.subtract({0}, {1})'
+    gradient_templates = ('{g}', 'np.negative({g})')
+    stateless = True
+    __slots__ = ()
+
     def __init__(self, x, y, **kwargs):
         super(subtract, self).__init__([x, y], **kwargs)
 
-    def apply_forward(self):
-        x, y = self.get_incoming_nodes()
-        output = np.subtract(x.data, y.data)
-        return output
+    def compute(self, x, y, out=None):
+        return np.subtract(x, y, out=out)
+
+    def compute_gradient(self, index, gradients, inputs, output):
+        if index == 0:
+            return gradients
+        return np.negative(gradients)
+
+    def gradient_node(self, index, gradients, inputs, output):
+        if index == 0:
+            return _sum_to(gradients, inputs[0])
+        return _sum_to(-gradients, inputs[1])
 
-    def apply_backward(self, with_respect):
-        x, y = self.get_incoming_nodes()
-        if with_respect is x:
-            with_respect.gradients += np.ones(x.shape) * self.gradients
-        elif with_respect is y:
-            with_respect.gradients += -np.ones(y.shape) * self.gradients
-        return variable.Variable(with_respect.gradients)
+    def compute_tangent(self, tangents, inputs, output, batched=False):
+        tx, ty = tangents
+        return _add_tangents(tx, None if ty is None else np.negative(ty))
 
 
 class multiply(Node):
+    elementwise = True
+    commutative = True
+    supports_out = True
+    forward_template = 'np.multiply({0}, {1})'
+    gradient_templates = ('{1} * {g}', '{0} * {g}')
+    stateless = True
+    __slots__ = ()
+
     def __init__(self, x, y, **kwargs):
         super(multiply, self).__init__([x, y], **kwargs)
 
-    def apply_forward(self):
-        x, y = self.get_incoming_nodes()
-        output = np.multiply(x.data, y.data)
-        return output
+    def compute(self, x, y, out=None):
+        return np.multiply(x, y, out=out)
+
+    def compute_gradient(self, index, gradients, inputs, output):
+        x, y = inputs
+        if index == 0:
+            return y * gradients
+        return x * gradients
 
-    def apply_backward(self, with_respect):
-        variable_1, variable_2 = self.get_incoming_nodes()
-        if with_respect is variable_1:
-            with_respect.gradients += variable_2.data * self.gradients
-        elif with_respect is variable_2:
-            variable_2.gradients += variable_1.data * self.gradients
-        return variable.Variable(with_respect.gradients)
+    def gradient_node(self, index, gradients, inputs, output):
+        x, y = inputs
+        if index == 0:
+            return _sum_to(y * gradients, x)
+        return _sum_to(x * gradients, y)
+
+    def compute_tangent(self, tangents, inputs, output, batched=False):
+        (x, y), (tx, ty) = inputs, tangents
+        return _add_tangents(None if tx is None else tx * y, None if ty is None else x * ty)
 
 
 class dot(Node):
+    forward_template = 'np.dot({0}, {1})'
+    stateless = True
+    __slots__ = ()
+
     def __init__(self, x, y, **kwargs):
         super().__init__([x, y], **kwargs)
 
-    def apply_forward(self):
-        x, y = self.get_incoming_nodes()
-        output = np.dot(x.data, y.data)
-        return output
-
-    def apply_backward(self, with_respect):
-        variable_1, variable_2 = self.get_incoming_nodes()
-        if with_respect is variable_1:
-            with_respect.gradients += variable_2.data * self.gradients
-        elif with_respect is variable_2:
-            with_respect.gradients += variable_1.data * self.gradients
-        return variable.Variable(with_respect.gradients)
+    def infer_shape(self, x, y):
+        return shapes.dot_shape(x, y)
+
+    def compute(self, x, y):
+        return np.dot(x, y)
+
+    def compute_gradient(self, index, gradients, inputs, output):
+        x, y = np.asarray(inputs[0]), np.asarray(inputs[1])
+        if x.ndim == 0 or y.ndim == 0:
+            # `np.dot` with a scalar is a multiplication
+            return (y if index == 0 else x) * gradients
+
+        gradients = np.broadcast_to(gradients, np.shape(output))
+        # `dot` contracts the last axis of `x` with the second to last axis of `y`
+        x_axes = x.ndim - 1
+        y_axis = max(y.ndim - 2, 0)
+        y_axes = [axis for axis in range(y.ndim) if axis != y_axis]
+        if index == 0:
+            return np.tensordot(gradients, y, axes=(list(range(x_axes, gradients.ndim)), y_axes))
+        grads = np.tensordot(x, gradients, axes=(list(range(x_axes)), list(range(x_axes))))
+        return np.moveaxis(grads, 0, y_axis)
+
+    def gradient_node(self, index, gradients, inputs, output):
+        x, y = inputs
+        gradients = _broadcast_like(gradients, output)
+        if len(x.shape) == 0 or len(y.shape) == 0:
+            return _sum_to((y if index == 0 else x) * gradients, inputs[index])
+        # `dot` is the matrix product of the rows of `x` (over its last axis) and of `y`
+        # with its contracted axis moved first and its other axes as the columns
+        x_shape, y_shape = x.shape, y.shape
+        y_axis = max(len(y_shape) - 2, 0)
+        axes = (y_axis,) + tuple(axis for axis in range(len(y_shape)) if axis != y_axis)
+        moved_shape = tuple(y_shape[axis] for axis in axes)
+        rows, columns = int(np.prod(x_shape[:-1])), int(np.prod(moved_shape[1:]))
+        gradients = reshape(gradients, (rows, columns))
+        if index == 0:
+            y = reshape(transpose(y, axes), (x_shape[-1], columns))
+            return reshape(matmul(gradients, transpose(y)), x_shape)
+        x = reshape(x, (rows, x_shape[-1]))
+        return transpose(reshape(matmul(transpose(x), gradients), moved_shape), np.argsort(axes))
+
+    def compute_tangent(self, tangents, inputs, output, batched=False):
+        if batched:
+            return self._tangent_per_direction(tangents, inputs, output)
+        (x, y), (tx, ty) = inputs, tangents
+        return _add_tangents(None if tx is None else np.dot(tx, y), None if ty is None else np.dot(x, ty))
 
 
 class matmul(Node):
+    supports_out = True
+    forward_template = 'np.matmul({0}, {1})'
+    stateless = True
+    __slots__ = ()
+
     def __init__(self, x, y, **kwargs):
         super().__init__([x, y], **kwargs)
 
-    def apply_forward(self):
-        x, y = self.get_incoming_nodes()
-        output = np.matmul(x.data, y.data)
-        return output
-
-    def apply_backward(self, with_respect):
-        variable_1, variable_2 = self.get_incoming_nodes()
-        if with_respect is variable_1:
-            with_respect.gradients += variable_2.data * self.gradients
-        elif with_respect is variable_2:
-            with_respect.gradients += variable_1.data * self.gradients
-        return variable.Variable(with_respect.gradients)
+    def infer_shape(self, x, y):
+        return shapes.matmul_shape(x, y)
+
+    def compute(self, x, y, out=None):
+        return np.matmul(x, y, out=out)
+
+    def compute_gradient(self, index, gradients, inputs, output):
+        x, y = np.asarray(inputs[0]), np.asarray(inputs[1])
+        gradients = np.broadcast_to(gradients, np.shape(output))
+        # 1-D operands are promoted to matrices like `np.matmul` does,
+        # the stacked (batch) axes are summed by `unbroadcast` afterwards
+        if y.ndim == 1:
+            y = y[:, np.newaxis]
+            gradients = np.expand_dims(gradients, -1)
+        if x.ndim == 1:
+            x = x[np.newaxis, :]
+            gradients = np.expand_dims(gradients, -2)
+
+        if index == 0:
+            grads = np.matmul(gradients, np.swapaxes(y, -1, -2))
+            return np.squeeze(grads, -2) if np.ndim(inputs[0]) == 1 else grads
+        grads = np.matmul(np.swapaxes(x, -1, -2), gradients)
+        return np.squeeze(grads, -1) if np.ndim(inputs[1]) == 1 else grads
+
+    def gradient_node(self, index, gradients, inputs, output):
+        return _matmul_gradient_node(index, _broadcast_like(gradients, output), *inputs)
+
+    def compute_tangent(self, tangents, inputs, output, batched=False):
+        x, y = np.asarray(inputs[0]), np.asarray(inputs[1])
+        tx, ty = tangents
+        if batched:
+            if x.ndim < 2 or y.ndim < 2:
+                # the directions axis would be taken for a matrix axis of a 1-D operand
+                return self._tangent_per_direction(tangents, inputs, output)
+            # unit stack axes after the directions axis so the stack axes of both operands line up
+            rank = max(x.ndim, y.ndim)
+            tx = None if tx is None else tx.reshape(tx.shape[:1] + (1,) * (rank - x.ndim) + x.shape)
+            ty = None if ty is None else ty.reshape(ty.shape[:1] + (1,) * (rank - y.ndim) + y.shape)
+        return _add_tangents(None if tx is None else np.matmul(tx, y), None if ty is None else np.matmul(x, ty))
 
 
 class sum(Node):
+    gradient_uses_inputs = False
+    forward_template = 'np.sum({0})'
+    gradient_templates = ('{g}',)
+    stateless = True
+    __slots__ = ()
+
     def __init__(self, x, **kwargs):
         super().__init__([x], **kwargs)
 
-    def apply_forward(self):
-        output = np.sum(self.get_incoming_nodes().data)
-        return output
+    def infer_shape(self, x):
+        return ()
+
+    def compute(self, x):
+        return np.sum(x)
+
+    def compute_gradient(self, index, gradients, inputs, output):
+        # broadcast back to the shape of `x` by `unbroadcast`
+        return gradients
 
-    def apply_backward(self, with_respect):
-        x = self.get_incoming_nodes()
-        if with_respect is x:
-            with_respect.gradients += np.ones(x.shape) * self.gradients
-        else:
-            with_respect.gradients += np.zeros(x.shape) * self.gradients
-        return variable.Variable(with_respect.gradients)
+    def gradient_node(self, index, gradients, inputs, output):
+        return _sum_to(gradients, inputs[0])
+
+    def compute_tangent(self, tangents, inputs, output, batched=False):
+        tx, = tangents
+        if batched:
+            return np.sum(np.reshape(tx, (len(tx), -1)), axis=1)
+        return np.sum(tx)
 
 
 class power(Node):
+    elementwise = True
+    supports_out = True
+    forward_template = 'np.power({0}, {op}.p)'
+    gradient_templates = ('({op}.p * {0} ** ({op}.p - 1)) * {g}',)
+    __slots__ = ('p',)
+
     def __init__(self, x, p, **kwargs):
-        super().__init__([x], **kwargs)
         self.p = p
+        super().__init__([x], **kwargs)
 
-    def apply_forward(self):
-        output = np.power(self.get_incoming_nodes().data, self.p)
-        return output
+    def infer_shape(self, x):
+        return shapes.broadcast_shapes(x, np.shape(self.p))
+
+    def infer_dtype(self, x):
+        # depends on `p` so it is not cached by type
+        return None if x is None else np.result_type(np.ones(1, x) ** self.p)
+
+    def signature(self):
+        # `p` is read from the operation, its shape and dtype change the generated code
+        return type(self), np.shape(self.p), np.result_type(self.p)
+
+    def key(self):
+        # an array `p` is not hashable
+        return (type(self), self.p) if np.ndim(self.p) == 0 else None
+
+    def compute(self, x, out=None):
+        return np.power(x, self.p, out=out)
 
-    def apply_backward(self, with_respect):
-        if with_respect:
-            with_respect.gradients += (self.p * with_respect.data ** (self.p - 1)) * self.gradients
-        return variable.Variable(with_respect.gradients)
+    def compute_gradient(self, index, gradients, inputs, output):
+        return (self.p * inputs[0] ** (self.p - 1)) * gradients
+
+    def gradient_node(self, index, gradients, inputs, output):
+        return _sum_to(multiply(power(inputs[0], self.p - 1), variable.constant(self.p)) * gradients, inputs[0])
+
+    def compute_tangent(self, tangents, inputs, output, batched=False):
+        return (self.p * inputs[0] ** (self.p - 1)) * tangents[0]
 
 
 class divide(Node):
+    elementwise = True
+    supports_out = True
+    forward_template = 'np.divide({0}, {1})'
+    gradient_templates = ('np.divide({g}, {1})', '-{g} * np.divide({0}, np.multiply({1}, {1}))')
+    stateless = True
+    __slots__ = ()
+
     def __init__(self, x, y, **kwargs):
         super().__init__([x, y], **kwargs)
 
-    def apply_forward(self):
-        x, y = self.get_incoming_nodes()
-        output = np.divide(x.data, y.data)
-        return output
+    def compute(self, x, y, out=None):
+        return np.divide(x, y, out=out)
 
-    def apply_backward(self, with_respect):
-        variable_1, variable_2 = self.get_incoming_nodes()
-        if with_respect is variable_1:
-            with_respect.gradients += np.float_power(variable_2.data, -1) * self.gradients
-        else:
-            with_respect.gradients += (variable_1.data * (-1 * np.float_power(variable_2.data, -2))) * self.gradients
-        return variable.Variable(with_respect.gradients)
+    def compute_gradient(self, index, gradients, inputs, output):
+        x, y = inputs
+        if index == 0:
+            return np.divide(gradients, y)
+        return -gradients * np.divide(x, np.multiply(y, y))
+
+    def gradient_node(self, index, gradients, inputs, output):
+        x, y = inputs
+        if index == 0:
+            return _sum_to(divide(gradients, y), x)
+        return _sum_to(-(gradients * divide(x, multiply(y, y))), y)
+
+    def compute_tangent(self, tangents, inputs, output, batched=False):
+        (x, y), (tx, ty) = inputs, tangents
+        return _add_tangents(
+            None if tx is None else np.divide(tx, y), None if ty is None else -ty * np.divide(output, y))
 
 
 class exp(Node):
+    elementwise = True
+    supports_out = True
+    gradient_uses_inputs = False
+    gradient_uses_output = True
+    forward_template = 'np.exp({0})'
+    gradient_templates = ('{out} * {g}',)
+    stateless = True
+    __slots__ = ()
+
     def __init__(self, x, **kwargs):
         super().__init__([x], **kwargs)
 
-    def apply_forward(self):
-        output = np.exp(self.get_incoming_nodes().data)
-        return output
+    def compute(self, x, out=None):
+        return np.exp(x, out=out)
+
+    def compute_gradient(self, index, gradients, inputs, output):
+        return output * gradients
+
+    def gradient_node(self, index, gradients, inputs, output):
+        return output * gradients
+
+    def compute_tangent(self, tangents, inputs, output, batched=False):
+        return output * tangents[0]
 
-    def apply_backward(self, with_respect):
-        # self.data == self.forward() but cached
-        with_respect.gradients += self.data * self.gradients
-        return variable.Variable(with_respect.gradients)
 
 class sigmoid(Node):
+    __slots__ = ('exp_op', 'add_op', 'div_op')
+
     def __init__(self, x, **kwargs):
-        super().__init__([x], **kwargs)
         # we could do it in one operation
         # but here I show how we can create an operation
         # that contains nested operations
         self.exp_op = exp(-x)
-        self.add_op = add(variable.Variable(1.0), self.exp_op)
-        self.div_op = divide(variable.Variable(1.0), self.add_op)
+        self.add_op = add(variable.constant(1.0), self.exp_op)
+        self.div_op = divide(variable.constant(1.0), self.add_op)
+        super().__init__([x], **kwargs)
+        # the last nested node is the output of the operation,
+        # the operations that use this one are connected to it instead
+        self.nested_nodes = [self.exp_op, self.add_op, self.div_op]
 
-    def apply_forward(self):
-        output_node = self.get_output_node()
-        output = output_node.forward()
-        return output
+    def infer_shape(self, x):
+        return self.div_op.static_shape
 
-    def apply_backward(self, with_respect):
-        output_node = self.get_output_node()
-        output_node.backward(with_respect)
-        x = self.get_incoming_nodes()
-        return variable.Variable(x.gradients)
+    def infer_dtype(self, x):
+        return self.div_op.dtype
+
+    def apply_forward(self):
+        return self.div_op.forward()
 
 
 class atomic_sigmoid(Node):
+    elementwise = True
+    supports_out = True
+    gradient_uses_inputs = False
+    gradient_uses_output = True
+    forward_template = 'np.divide(1, (1 + np.exp(-{0})))'
+    gradient_templates = ('({out} * (1 - {out})) * {g}',)
+    stateless = True
+    __slots__ = ()
+
     def __init__(self, x, **kwargs):
         super().__init__([x], **kwargs)
-        # the same as `sigmoid` class but the `sigmoid` class is decomposed 
-        # into multiple operations but this class 
-        # implements the forward and backward directly 
+        # the same as `sigmoid` class but the `sigmoid` class is decomposed
+        # into multiple operations but this class
+        # implements the forward and backward directly
         # without depending on other operations
         # `atomic_sigmoid` is faster because of the reasons mentioned above
 
-    def apply_forward(self):
-        x = self.get_incoming_nodes().data
-        return np.divide(1, (1 + np.exp(-x)))
+    def compute(self, x, out=None):
+        if out is None:
+            return np.divide(1, (1 + np.exp(-x)))
+        # every step is written to `out`, `x` may be `out` itself
+        np.negative(x, out=out)
+        np.exp(out, out=out)
+        np.add(out, 1, out=out)
+        return np.divide(1, out, out=out)
+
+    def compute_gradient(self, index, gradients, inputs, output):
+        return (output * (1 - output)) * gradients
+
+    def gradient_node(self, index, gradients, inputs, output):
+        return (output * subtract(variable.constant(1.0), output)) * gradients
+
+    def compute_tangent(self, tangents, inputs, output, batched=False):
+        return (output * (1 - output)) * tangents[0]
 
-    def apply_backward(self, with_respect):
-        output = self.apply_forward()
-        with_respect.gradients += (output * (1 - output)) * self.gradients
-        return variable.Variable(with_respect.gradients)
 
 class relu(Node):
+    elementwise = True
+    supports_out = True
+    gradient_uses_inputs = False
+    gradient_uses_output = True
+    forward_template = 'np.maximum({0}, 0.)'
+    gradient_templates = ('({out} > 0) * {g}',)
+    stateless = True
+    __slots__ = ()
+
     def __init__(self, x, **kwargs):
         super().__init__([x], **kwargs)
-    
-    def apply_forward(self):
-        x = self.get_incoming_nodes()
-        output = np.maximum(x.data, 0.)
-        return output
 
-    def apply_backward(self, with_respect):
-        with_respect.gradients += (self.data > 0) * self.gradients
-        return autograd.Variable(with_respect.gradients)
+    def compute(self, x, out=None):
+        return np.maximum(x, 0., out=out)
+
+    def compute_gradient(self, index, gradients, inputs, output):
+        return (output > 0) * gradients
+
+    def gradient_node(self, index, gradients, inputs, output):
+        # the mask does not depend on the inputs, `step` has zero gradients
+        return step(output) * gradients
+
+    def compute_tangent(self, tangents, inputs, output, batched=False):
+        return (output > 0) * tangents[0]
+
 
 class sin(Node):
+    elementwise = True
+    supports_out = True
+    forward_template = 'np.sin({0})'
+    gradient_templates = ('np.cos({0}) * {g}',)
+    stateless = True
+    __slots__ = ()
+
     def __init__(self, x, **kwargs):
         super().__init__([x], **kwargs)
 
-    def apply_forward(self):
-        output = np.sin(self.get_incoming_nodes().data)
-        return output
+    def compute(self, x, out=None):
+        return np.sin(x, out=out)
+
+    def compute_gradient(self, index, gradients, inputs, output):
+        return np.cos(inputs[0]) * gradients
 
-    def apply_backward(self, with_respect):
-        with_respect.gradients += np.cos(self.get_incoming_nodes().data) * self.gradients
-        return variable.Variable(with_respect.gradients)
+    def gradient_node(self, index, gradients, inputs, output):
+        return cos(inputs[0]) * gradients
+
+    def compute_tangent(self, tangents, inputs, output, batched=False):
+        return np.cos(inputs[0]) * tangents[0]
 
 
 class cos(Node):
+    elementwise = True
+    supports_out = True
+    forward_template = 'np.cos({0})'
+    gradient_templates = ('-np.sin({0}) * {g}',)
+    stateless = True
+    __slots__ = ()
+
     def __init__(self, x, **kwargs):
         super().__init__([x], **kwargs)
 
-    def apply_forward(self):
-        output = np.cos(self.get_incoming_nodes().data)
-        return output
+    def compute(self, x, out=None):
+        return np.cos(x, out=out)
+
+    def compute_gradient(self, index, gradients, inputs, output):
+        return -np.sin(inputs[0]) * gradients
+
+    def gradient_node(self, index, gradients, inputs, output):
+        return -sin(inputs[0]) * gradients
 
-    def apply_backward(self, with_respect):
-        with_respect.gradients += -np.sin(self.get_incoming_nodes().data) * self.gradients
-        return variable.Variable(with_respect.gradients)
+    def compute_tangent(self, tangents, inputs, output, batched=False):
+        return -np.sin(inputs[0]) * tangents[0]
 
 
 class sinh(Node):
+    elementwise = True
+    supports_out = True
+    forward_template = 'np.sinh({0})'
+    gradient_templates = ('np.cosh({0}) * {g}',)
+    stateless = True
+    __slots__ = ()
+
     def __init__(self, x, **kwargs):
         super().__init__([x], **kwargs)
 
-    def apply_forward(self):
-        output = np.sinh(self.get_incoming_nodes().data)
-        return output
+    def compute(self, x, out=None):
+        return np.sinh(x, out=out)
+
+    def compute_gradient(self, index, gradients, inputs, output):
+        return np.cosh(inputs[0]) * gradients
+
+    def gradient_node(self, index, gradients, inputs, output):
+        return cosh(inputs[0]) * gradients
 
-    def apply_backward(self, with_respect):
-        with_respect.gradients += np.cosh(self.get_incoming_nodes().data) * self.gradients
-        return variable.Variable(with_respect.gradients)
+    def compute_tangent(self, tangents, inputs, output, batched=False):
+        return np.cosh(inputs[0]) * tangents[0]
 
 
 class cosh(Node):
+    elementwise = True
+    supports_out = True
+    forward_template = 'np.cosh({0})'
+    gradient_templates = ('np.sinh({0}) * {g}',)
+    stateless = True
+    __slots__ = ()
+
     def __init__(self, x, **kwargs):
         super().__init__([x], **kwargs)
 
-    def apply_forward(self):
-        output = np.cosh(self.get_incoming_nodes().data)
-        return output
+    def compute(self, x, out=None):
+        return np.cosh(x, out=out)
+
+    def compute_gradient(self, index, gradients, inputs, output):
+        return np.sinh(inputs[0]) * gradients
+
+    def gradient_node(self, index, gradients, inputs, output):
+        return sinh(inputs[0]) * gradients
+
+    def compute_tangent(self, tangents, inputs, output, batched=False):
+        return np.sinh(inputs[0]) * tangents[0]
+
+
+class transpose(Node):
+    gradient_uses_inputs = False
+    forward_template = 'np.transpose({0}, {op}.axes)'
+    gradient_templates = ('np.transpose({g}, {op}.inverse_axes)',)
+    __slots__ = ('axes',)
+
+    def __init__(self, x, axes=None, **kwargs):
+        # None reverses the axes like `np.transpose`
+        self.axes = None if axes is None else tuple(int(axis) for axis in axes)
+        super().__init__([x], **kwargs)
+
+    @property
+    def inverse_axes(self):
+        return None if self.axes is None else tuple(int(axis) for axis in np.argsort(self.axes))
+
+    def infer_shape(self, x):
+        if x is None:
+            return None
+        axes = range(len(x) - 1, -1, -1) if self.axes is None else self.axes
+        return tuple(x[axis] for axis in axes)
+
+    def infer_dtype(self, x):
+        return x
+
+    def signature(self):
+        return self.key()
+
+    def key(self):
+        return type(self), self.axes
+
+    def compute(self, x):
+        return np.transpose(x, self.axes)
+
+    def compute_gradient(self, index, gradients, inputs, output):
+        return np.transpose(np.broadcast_to(gradients, np.shape(output)), self.inverse_axes)
+
+    def gradient_node(self, index, gradients, inputs, output):
+        return transpose(_broadcast_like(gradients, output), self.inverse_axes)
+
+    def compute_tangent(self, tangents, inputs, output, batched=False):
+        tx, = tangents
+        if not batched:
+            return np.transpose(tx, self.axes)
+        axes = range(np.ndim(output) - 1, -1, -1) if self.axes is None else self.axes
+        return np.transpose(tx, (0,) + tuple(axis + 1 for axis in axes))
+
+
+class sum_to(Node):
+    gradient_uses_inputs = False
+    forward_template = '_unbroadcast({0}, {op}.target_shape)'
+    gradient_templates = ('{g}',)
+    __slots__ = ('target_shape',)
+
+    def __init__(self, x, shape, **kwargs):
+        # sums the axes that broadcasting to `shape` would add or expand, see `backend.unbroadcast`
+        self.target_shape = tuple(shape)
+        super().__init__([x], **kwargs)
+
+    def infer_shape(self, x):
+        return self.target_shape
+
+    def infer_dtype(self, x):
+        return x
+
+    def signature(self):
+        return self.key()
+
+    def key(self):
+        return type(self), self.target_shape
+
+    def compute(self, x):
+        return backend.unbroadcast(x, self.target_shape)
+
+    def compute_gradient(self, index, gradients, inputs, output):
+        # broadcast back to the shape of `x` by `unbroadcast`
+        return gradients
+
+    def gradient_node(self, index, gradients, inputs, output):
+        return _sum_to(gradients, inputs[0])
+
+    def compute_tangent(self, tangents, inputs, output, batched=False):
+        if batched:
+            return self._tangent_per_direction(tangents, inputs, output)
+        return backend.unbroadcast(tangents[0], self.target_shape)
+
+
+class broadcast_to(Node):
+    gradient_uses_inputs = False
+    forward_template = 'np.broadcast_to({0}, {op}.target_shape)'
+    gradient_templates = ('{g}',)
+    __slots__ = ('target_shape',)
+
+    def __init__(self, x, shape, **kwargs):
+        self.target_shape = tuple(shape)
+        super().__init__([x], **kwargs)
+
+    def infer_shape(self, x):
+        return self.target_shape
+
+    def infer_dtype(self, x):
+        return x
+
+    def signature(self):
+        return self.key()
+
+    def key(self):
+        return type(self), self.target_shape
+
+    def compute(self, x):
+        return np.broadcast_to(x, self.target_shape)
+
+    def compute_gradient(self, index, gradients, inputs, output):
+        # summed over the broadcast axes by `unbroadcast`
+        return gradients
+
+    def gradient_node(self, index, gradients, inputs, output):
+        return _sum_to(gradients, inputs[0])
+
+    def compute_tangent(self, tangents, inputs, output, batched=False):
+        tx, = tangents
+        if not batched:
+            return np.broadcast_to(tx, self.target_shape)
+        # unit axes after the directions axis so the axes of `x` line up with the end of the shape
+        tx = tx.reshape(tx.shape[:1] + (1,) * (len(self.target_shape) - (tx.ndim - 1)) + tx.shape[1:])
+        return np.broadcast_to(tx, tx.shape[:1] + self.target_shape)
+
+
+class reshape(Node):
+    gradient_uses_inputs = False
+    forward_template = 'np.reshape({0}, {op}.target_shape)'
+    gradient_templates = ('np.reshape({g}, np.shape({0}))',)
+    __slots__ = ('target_shape',)
+
+    def __init__(self, x, shape, **kwargs):
+        self.target_shape = tuple(shape)
+        super().__init__([x], **kwargs)
+
+    def infer_shape(self, x):
+        # a -1 dimension is only known at run time
+        return None if -1 in self.target_shape else self.target_shape
+
+    def infer_dtype(self, x):
+        return x
+
+    def signature(self):
+        return self.key()
+
+    def key(self):
+        return type(self), self.target_shape
+
+    def compute(self, x):
+        return np.reshape(x, self.target_shape)
+
+    def compute_gradient(self, index, gradients, inputs, output):
+        return np.reshape(np.broadcast_to(gradients, np.shape(output)), np.shape(inputs[0]))
+
+    def gradient_node(self, index, gradients, inputs, output):
+        return reshape(_broadcast_like(gradients, output), inputs[0].shape)
+
+    def compute_tangent(self, tangents, inputs, output, batched=False):
+        tx, = tangents
+        return np.reshape(tx, tx.shape[:1] + np.shape(output) if batched else np.shape(output))
+
+
+class step(Node):
+    elementwise = True
+    gradient_uses_inputs = False
+    forward_template = 'np.greater({0}, 0).astype(np.result_type({0}))'
+    gradient_templates = ('np.zeros_like({g})',)
+    stateless = True
+    __slots__ = ()
+
+    def __init__(self, x, **kwargs):
+        # 1 where `x` is positive and 0 elsewhere, e.g. the mask of `relu`
+        super().__init__([x], **kwargs)
+
+    def compute(self, x):
+        return np.greater(x, 0).astype(np.result_type(x))
+
+    def compute_gradient(self, index, gradients, inputs, output):
+        return np.zeros_like(gradients)
+
+    def gradient_node(self, index, gradients, inputs, output):
+        return None
 
-    def apply_backward(self, with_respect):
-        with_respect.gradients += np.sinh(self.get_incoming_nodes().data) * self.gradients
-        return variable.Variable(with_respect.gradients)
+    def compute_tangent(self, tangents, inputs, output, batched=False):
+        return np.zeros_like(tangents[0])
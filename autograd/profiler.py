@@ -0,0 +1,180 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import namedtuple
+
+import numpy as np
+
+from autograd import backend
+
+# one execution of an operation, the times are in nanoseconds, `output_bytes` are the bytes
+# of the arrays it returned and `allocated` the peak of the memory it allocated (if tracked)
+Event = namedtuple('Event', (
+    'phase', 'op', 'name', 'start', 'duration', 'input_shapes',
+    'output_shapes', 'output_bytes', 'allocated', 'thread',
+))
+
+
+def _nbytes(values):
+    return sum(getattr(value, 'nbytes', 0) for value in values)
+
+
+def _name(op):
+    # the fused instructions of a `Session` do not have names
+    return getattr(op, 'name', None) or repr(op)
+
+
+class profile:
+    """Context manager that records every operation executed by `Node.forward`,
+    `Node.backward`, `Session.run` and `ParallelSession.run` inside it.
+    When no profiler is active the passes only check `backend.PROFILER` for None.
+
+    The events of operations that run other operations (e.g. `checkpoint`)
+    include the time of the operations they run, which are recorded too.
+    With `track_allocations=True` the peak of the memory allocated by every
+    operation is measured with `tracemalloc`, which slows the operations down.
+
+    Example:
+        with autograd.profile() as prof:
+            loss.forward()
+            loss.backward(weights)
+        print(prof.table())
+        prof.export_chrome_trace('trace.json')  # opened in chrome://tracing or Perfetto
+    """
+
+    def __init__(self, track_allocations=False):
+        self.track_allocations = track_allocations
+        self.events = []
+        self._previous = None
+        self._started_tracemalloc = False
+        self._start = None
+
+    def __enter__(self):
+        if self.track_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self._start = time.perf_counter_ns()
+        self._previous = backend.set_profiler(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        backend.set_profiler(self._previous)
+        self._previous = None
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def _call(self, function, *args):
+        if self.track_allocations:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter_ns()
+        result = function(*args)
+        duration = time.perf_counter_ns() - start
+        allocated = tracemalloc.get_traced_memory()[1] - before if self.track_allocations else None
+        return result, start, duration, allocated
+
+    def _record(self, phase, op, start, duration, inputs, outputs, allocated):
+        # `list.append` is atomic, so the threads of a `ParallelSession` can record at the same time
+        self.events.append(Event(
+            phase, type(op).__name__, _name(op), start, duration,
+            [np.shape(value) for value in inputs], [np.shape(value) for value in outputs],
+            _nbytes(outputs), allocated, threading.get_ident(),
+        ))
+
+    def forward(self, op, inputs, compute=None):
+        """Runs an instruction of a `Session`, `compute(*inputs)` (`op.compute` by default)"""
+
+        output, start, duration, allocated = self._call(compute or op.compute, *inputs)
+        self._record('forward', op, start, duration, inputs, [output], allocated)
+        return output
+
+    def compute_gradients(self, op, indices, gradients, inputs, output):
+        """Runs the backward of an instruction of a `Session`"""
+
+        grads, start, duration, allocated = self._call(op.compute_gradients, indices, gradients, inputs, output)
+        self._record('backward', op, start, duration, inputs, grads, allocated)
+        return grads
+
+    def apply_forward(self, node):
+        inputs = [incoming_node.data for incoming_node in node.incoming_nodes]
+        output, start, duration, allocated = self._call(node.apply_forward)
+        self._record('forward', node, start, duration, inputs, [output], allocated)
+        return output
+
+    def apply_backward(self, node, with_respect):
+        inputs = [incoming_node.data for incoming_node in node.incoming_nodes]
+        _, start, duration, allocated = self._call(node.apply_backward, with_respect)
+        self._record('backward', node, start, duration, inputs, [with_respect.gradients], allocated)
+
+    def summary(self):
+        """Returns `{(phase, op): totals}` where the totals are the number of `calls`,
+        the number of distinct `nodes` (fewer than the calls if they were recomputed),
+        the `total_time` in seconds and the `output_bytes` and `allocated` bytes"""
+
+        totals = {}
+        names = {}
+        for event in self.events:
+            key = (event.phase, event.op)
+            entry = totals.get(key)
+            if entry is None:
+                entry = totals[key] = {'calls': 0, 'nodes': 0, 'total_time': 0., 'output_bytes': 0, 'allocated': 0}
+                names[key] = set()
+            entry['calls'] += 1
+            entry['total_time'] += event.duration / 1e9
+            entry['output_bytes'] += event.output_bytes
+            entry['allocated'] += event.allocated or 0
+            names[key].add(event.name)
+        for key, entry in totals.items():
+            entry['nodes'] = len(names[key])
+        return totals
+
+    def table(self, sort_by='total_time', limit=None):
+        """Returns the `summary` as a table sorted by one of its totals"""
+
+        totals = sorted(self.summary().items(), key=lambda item: item[1][sort_by], reverse=True)[:limit]
+        time_sum = sum(entry['total_time'] for _, entry in totals) or 1.
+        header = (
+            f"{'phase':<9} {'op':<20} {'calls':>8} {'nodes':>8} {'total (ms)':>11} "
+            f"{'mean (us)':>10} {'time':>6} {'output (MiB)':>13}"
+        )
+        if self.track_allocations:
+            header += f" {'allocated (MiB)':>16}"
+        lines = [header, '-' * len(header)]
+        for (phase, op), entry in totals:
+            line = (
+                f"{phase:<9} {op:<20} {entry['calls']:>8} {entry['nodes']:>8} "
+                f"{entry['total_time'] * 1e3:>11.3f} {entry['total_time'] / entry['calls'] * 1e6:>10.1f} "
+                f"{entry['total_time'] / time_sum:>6.1%} {entry['output_bytes'] / 2**20:>13.2f}"
+            )
+            if self.track_allocations:
+                line += f" {entry['allocated'] / 2**20:>16.2f}"
+            lines.append(line)
+        return '\n'.join(lines)
+
+    def chrome_trace(self):
+        """Returns the events in the Chrome `trace_event` format"""
+
+        pid = os.getpid()
+        trace_events = []
+        for event in self.events:
+            args = {
+                'name': event.name,
+                'input_shapes': [list(shape) for shape in event.input_shapes],
+                'output_shapes': [list(shape) for shape in event.output_shapes],
+                'output_bytes': event.output_bytes,
+            }
+            if event.allocated is not None:
+                args['allocated'] = event.allocated
+            trace_events.append({
+                'name': event.op, 'cat': event.phase, 'ph': 'X', 'pid': pid, 'tid': event.thread,
+                # in microseconds since the profiler was entered
+                'ts': (event.start - self._start) / 1e3, 'dur': event.duration / 1e3, 'args': args,
+            })
+        return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+    def export_chrome_trace(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.chrome_trace(), f)
@@ -1,15 +1,315 @@
+from collections import namedtuple
 
+import numpy as np
+
+from autograd import backend, fusion, memory, simplification
+from autograd.exceptions import NoPathFoundError
+from autograd.node import Node, resolve_composite
+from autograd.variable import Placeholder
+
+
+# the graph that ends at a node as slots, see `lower`
+LoweredGraph = namedtuple('LoweredGraph', (
+    'slots', 'leaves', 'instructions', 'output_slot', 'constants', 'constant_slots',
+))
+
+
+def _topological_order(last_node):
+    order = []
+    # composite operations like `sigmoid` are already inlined, only the last node can be one
+    last_node = resolve_composite(last_node)
+    visited = {last_node}
+    stack = [(last_node, iter(last_node.incoming_nodes if isinstance(last_node, Node) else ()))]
+    while stack:
+        node, inputs = stack[-1]
+        for i in inputs:
+            if i in visited:
+                continue
+            visited.add(i)
+            if isinstance(i, Node):
+                stack.append((i, iter(i.incoming_nodes)))
+                break
+            order.append(i)
+        else:
+            stack.pop()
+            order.append(node)
+    return order
+
+
+def lower(last_node, simplify=True):
+    """Assigns a slot to every node and leaf of the graph that ends at `last_node`,
+    returns a `LoweredGraph` of the slot of every node and leaf, the `(slot, leaf)`
+    of the leaves, the topologically ordered `(operation, input slots, output slot)`
+    instructions and the output slot, shared by `Session` and `codegen`.
+
+    With `simplify` the instructions are simplified, see `simplification`, the
+    `(slot, value)` of the folded operations are fed like the leaves and the
+    slots that were folded or merged do not get a value of their own"""
+
+    order = _topological_order(last_node)
+    slots = {node: slot for slot, node in enumerate(order)}
+    # operations created inside `no_grad` have no incoming nodes and act as constants
+    leaves = [(slots[node], node) for node in order if not isinstance(node, Node) or not node.incoming_nodes]
+    instructions = [
+        (node, tuple(slots[i] for i in node.incoming_nodes), slots[node])
+        for node in order if isinstance(node, Node) and node.incoming_nodes
+    ]
+    output_slot = slots[resolve_composite(last_node)]
+    constants = []
+    constant_slots = set()
+    if simplify:
+        instructions, constants, replaced = simplification.simplify_instructions(instructions, leaves, output_slot)
+        leaves = [(slot, leaf) for slot, leaf in leaves if slot not in replaced]
+        output_slot = replaced.get(output_slot, output_slot)
+        constant_slots = set(replaced).union(slot for slot, _ in constants)
+    return LoweredGraph(slots, leaves, instructions, output_slot, constants, constant_slots)
 
 
 class Session:
-    def __init__(self, last_node):
+    """Compiles the graph that ends at `last_node` once into a flat,
+    topologically ordered list of instructions where every node and leaf
+    has a preassigned slot, so `run` only loops over the instructions
+    instead of walking the graph of python objects on every call.
+
+    Example:
+        x = autograd.Placeholder()
+        w = autograd.Variable(2.)
+        out = autograd.sigmoid(x * w)
+        with Session(out) as session:
+            result = session.run(feed_dict={x: 3.})
+            result, (w_grad,) = session.run(feed_dict={x: 3.}, with_respect=[w])
+
+    With `plan_memory=True` every intermediate value is released right after its
+    last use, values that the backward pass does not read are not kept for it,
+    and the released arrays are reused by the next operations, see `memory`.
+
+    With `simplify=True` the operations that only depend on constants are computed
+    once when the session is created and the operations that compute the same output
+    from the same inputs are merged, see `simplification`.
+    """
+
+    def __init__(self, last_node, fuse=True, plan_memory=False, simplify=True):
         self.last_node = last_node
+        # runs of elementwise operations are executed as one instruction, see `fusion`
+        self.fuse = fuse
+        self.plan_memory = plan_memory
+        self.simplify = simplify
+        self._compile()
 
     def __enter__(self):
-        pass
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _compile(self):
+        graph = lower(self.last_node, self.simplify)
+        self._slots = graph.slots
+        self._leaves = graph.leaves
+        self._instructions = graph.instructions
+        self._nodes = [node for node, _, _ in self._instructions]
+        self._output_slot = graph.output_slot
+        # `(slot, value)` of the folded operations, fed like the leaves
+        self._constants = graph.constants
+        # the slots without a value of their own, they are folded or merged
+        self._constant_slots = graph.constant_slots
+        self._fused_slots = set()
+        if self.fuse:
+            self._instructions, self._fused_slots = fusion.fuse_elementwise(self._instructions)
+        self._forward_plan = [(op.compute, input_slots, output_slot) for op, input_slots, output_slot in self._instructions]
+        self._backward_plans = {}
+        self._memory_plans = {}
+        self._pool = memory.BufferPool(max_buffers=len(self._instructions))
+        self._values = [None] * len(self._slots)
+
+    def _backward_plan(self, with_respect):
+        """Returns `(operation, indices, input slots, output slot)` for every
+        instruction where the inputs at `indices` lead to one of the `with_respect` leaves,
+        ordered from the output to the inputs"""
+
+        key = tuple(with_respect)
+        plan = self._backward_plans.get(key)
+        if plan is not None:
+            return plan
+
+        for var in with_respect:
+            if var not in self._slots:
+                raise NoPathFoundError(f"Cannot create a graph for variable {var}")
+            if self._slots[var] in self._fused_slots:
+                raise ValueError(f"{var} is fused with other operations, create the session with `fuse=False`.")
+            if self._slots[var] in self._constant_slots:
+                raise ValueError(f"{var} is folded or merged with other operations, create the session with `simplify=False`.")
+
+        needed = {self._slots[var] for var in with_respect}
+        plan = []
+        for op, input_slots, output_slot in self._instructions:
+            indices = tuple(index for index, input_slot in enumerate(input_slots) if input_slot in needed)
+            if indices:
+                needed.add(output_slot)
+                plan.append((op, indices, input_slots, output_slot))
+        plan.reverse()
+        self._backward_plans[key] = plan
+        return plan
+
+    def _memory_plan(self, with_respect):
+        key = None if with_respect is None else tuple(with_respect)
+        plan = self._memory_plans.get(key)
+        if plan is None:
+            backward_plan = None if with_respect is None else self._backward_plan(with_respect)
+            plan = self._memory_plans[key] = memory.plan_liveness(self._instructions, backward_plan, self._output_slot)
+        return plan
+
+    def _compute(self, op, inputs):
+        # writes to a released array of the same shape and dtype if there is one
+        if op.supports_out and op.dtype is not None:
+            out = self._pool.take(op.infer_shape(*[np.shape(value) for value in inputs]), op.dtype)
+            if out is not None:
+                try:
+                    return op.compute(*inputs, out=out)
+                except TypeError:
+                    pass
+        return op.compute(*inputs)
+
+    def _release(self, values, slot, released_shapes):
+        value = values[slot]
+        values[slot] = None
+        released_shapes[slot] = np.shape(value)
+        self._pool.release(value)
+
+    @staticmethod
+    def _read(values, slots, released_shapes):
+        # the backward rules that do not use a released value only read its shape
+        return [
+            values[slot] if values[slot] is not None else np.broadcast_to(np.empty(()), released_shapes[slot])
+            for slot in slots
+        ]
+
+    def run(self, feed_dict: dict = {}, with_respect=None, output_gradients=1.0, assign_gradients=True):
+        """Runs the compiled graph with the placeholders in `feed_dict`
+        and returns the output, if `with_respect` is passed the gradients
+        of these leaves are also computed and `(output, gradients)` is returned,
+        `output_gradients` are the gradients the backward pass starts from.
+        The gradients are also written to the leaves unless `assign_gradients` is False"""
+
+        with_respect = self._with_respect(with_respect)
+
+        if self.plan_memory:
+            values = [None] * len(self._slots)
+            forward_releases, backward_releases = self._memory_plan(with_respect)
+            released_shapes = {}
+        else:
+            if self._values is None:
+                self._values = [None] * len(self._slots)
+            values = self._values
+
+        self._feed(values, feed_dict)
+
+        if self.plan_memory:
+            for (op, input_slots, output_slot), releases in zip(self._instructions, forward_releases):
+                values[output_slot] = self._apply(op, [values[i] for i in input_slots], self._compute)
+                for slot in releases:
+                    self._release(values, slot, released_shapes)
+        elif backend.PROFILER is None:
+            for compute, input_slots, output_slot in self._forward_plan:
+                values[output_slot] = compute(*[values[i] for i in input_slots])
+        else:
+            for op, input_slots, output_slot in self._instructions:
+                values[output_slot] = self._apply(op, [values[i] for i in input_slots])
+        output = values[self._output_slot]
+
+        if with_respect is None:
+            return output
+
+        gradients = self._seed(values, output_gradients)
+        for step, (op, indices, input_slots, output_slot) in enumerate(self._backward_plan(with_respect)):
+            if self.plan_memory:
+                inputs = self._read(values, input_slots, released_shapes)
+                op_output, = self._read(values, (output_slot,), released_shapes)
+            else:
+                inputs = [values[i] for i in input_slots]
+                op_output = values[output_slot]
+            op_gradients = self._input_gradients(op, indices, gradients[output_slot], inputs, op_output)
+            self._add_gradients(gradients, indices, input_slots, op_gradients)
+            # all the gradients of an output are added before its instruction
+            gradients[output_slot] = None
+            if self.plan_memory:
+                for slot in backward_releases[step]:
+                    self._release(values, slot, released_shapes)
+
+        return output, self._results(gradients, with_respect, assign_gradients)
+
+    @staticmethod
+    def _with_respect(with_respect):
+        # a leaf or a (nested) list of leaves
+        if with_respect is None:
+            return None
+        return backend.flatten(with_respect) if isinstance(with_respect, (tuple, list)) else [with_respect]
+
+    @staticmethod
+    def _apply(op, inputs, compute=None):
+        """Computes the output of the instruction of `op`, through the active profiler if there is one,
+        `compute(op, inputs)` is called instead of `op.compute(*inputs)` if it is passed"""
+        profiler = backend.PROFILER
+        if profiler is None:
+            return op.compute(*inputs) if compute is None else compute(op, inputs)
+        if compute is None:
+            return profiler.forward(op, inputs)
+        return profiler.forward(op, inputs, lambda *inputs: compute(op, inputs))
+
+    def _seed(self, values, output_gradients):
+        # the seed has the shape of the output, like in `codegen` and `BatchedSession`
+        output = values[self._output_slot]
+        gradients = [None] * len(values)
+        gradients[self._output_slot] = np.broadcast_to(backend.seed_gradients(output_gradients, output), np.shape(output))
+        return gradients
+
+    @staticmethod
+    def _input_gradients(op, indices, gradients, inputs, output):
+        """Returns the gradients of the inputs of `op` at `indices`
+        summed over the axes they were broadcast along"""
+        profiler = backend.PROFILER
+        if profiler is None:
+            op_gradients = op.compute_gradients(indices, gradients, inputs, output)
+        else:
+            op_gradients = profiler.compute_gradients(op, indices, gradients, inputs, output)
+        return [backend.unbroadcast(grads, np.shape(inputs[index])) for index, grads in zip(indices, op_gradients)]
+
+    @staticmethod
+    def _add_gradients(gradients, indices, input_slots, op_gradients):
+        for index, grads in zip(indices, op_gradients):
+            input_slot = input_slots[index]
+            if gradients[input_slot] is None:
+                gradients[input_slot] = grads
+            else:
+                gradients[input_slot] = gradients[input_slot] + grads
+
+    def _feed(self, values, feed_dict):
+        for placeholder in feed_dict:
+            if not isinstance(placeholder, Placeholder) or placeholder not in self._slots:
+                raise ValueError(f"{placeholder} is not a placeholder of this graph.")
+        for slot, leaf in self._leaves:
+            if leaf in feed_dict:
+                values[slot] = leaf.validate(feed_dict[leaf])
+            else:
+                values[slot] = leaf.data
+        for slot, value in self._constants:
+            values[slot] = value
 
-    def __exit__(self):
-        pass
+    def _results(self, gradients, with_respect, assign_gradients):
+        results = []
+        for var in with_respect:
+            grads = gradients[self._slots[var]]
+            if assign_gradients:
+                # copied into the gradient buffer of `var`, the returned array is not reused,
+                # or added to the previous passes if `backend.enable_reset_gradients(False)`
+                if backend.reset_gradient_enabled():
+                    var.gradients = grads
+                else:
+                    var._accumulate_gradients(grads)
+            results.append(grads)
+        return results
 
-    def run(self, feed_dict: dict = {}):
-        pass
\ No newline at end of file
+    def close(self):
+        # drops the intermediate values of the last run
+        self._values = None
+        self._pool.clear()
@@ -0,0 +1,84 @@
+from autograd.exceptions import ShapeError
+
+
+# static shapes are tuples where a dimension is `None` if it is only known
+# at run time (e.g. the batch dimension of a `Placeholder`),
+# the shape itself is `None` if even its rank is unknown
+
+
+def is_static(shape):
+    return shape is not None and None not in shape
+
+
+def _broadcast_dims(x, y):
+    if x == 1:
+        return y
+    if y == 1:
+        return x
+    if x is None:
+        # `None` broadcast with a known dimension can only be 1 or the same dimension
+        return y
+    if y is None or x == y:
+        return x
+    raise ShapeError
+
+
+def broadcast_shapes(*shapes):
+    first = shapes[0] if shapes else ()
+    for shape in shapes:
+        if shape != first:
+            break
+    else:
+        # the common case of operands with the same shape
+        return first
+    if any(shape is None for shape in shapes):
+        return None
+    ndim = max((len(shape) for shape in shapes), default=0)
+    result = [1] * ndim
+    for shape in shapes:
+        offset = ndim - len(shape)
+        for i, dim in enumerate(shape):
+            try:
+                result[offset + i] = _broadcast_dims(result[offset + i], dim)
+            except ShapeError:
+                raise ShapeError(f"operands could not be broadcast together with shapes {shapes}") from None
+    return tuple(result)
+
+
+def _check_contraction(x_dim, y_dim, x, y):
+    if x_dim is not None and y_dim is not None and x_dim != y_dim:
+        raise ShapeError(f"mismatch in the contracted dimension of shapes {x} and {y}")
+
+
+def matmul_shape(x, y):
+    if x is None or y is None:
+        return None
+    if len(x) == 0 or len(y) == 0:
+        raise ShapeError("matmul does not accept scalars")
+    _check_contraction(x[-1], y[0] if len(y) == 1 else y[-2], x, y)
+    # 1-D operands are promoted to matrices and the added axis is removed afterwards
+    batch = broadcast_shapes(x[:-2], y[:-2])
+    rows = x[-2:-1]
+    cols = y[-1:] if len(y) > 1 else ()
+    return batch + rows + cols
+
+
+def dot_shape(x, y):
+    if x is None or y is None:
+        return None
+    if len(x) == 0 or len(y) == 0:
+        # `np.dot` with a scalar is a multiplication
+        return broadcast_shapes(x, y)
+    if len(y) == 1:
+        _check_contraction(x[-1], y[0], x, y)
+        return x[:-1]
+    _check_contraction(x[-1], y[-2], x, y)
+    return x[:-1] + y[:-2] + y[-1:]
+
+
+def compatible(shape, static_shape):
+    """Returns True if a value of `shape` can be used where `static_shape` is expected"""
+    if static_shape is None:
+        return True
+    return len(shape) == len(static_shape) and all(
+        expected is None or dim == expected for dim, expected in zip(shape, static_shape))
@@ -0,0 +1,66 @@
+import numpy as np
+
+from autograd.node import Node
+from autograd.variable import Constant
+
+# constant leaves up to this size are merged by value
+_MAX_INTERNED_SIZE = 1024
+
+
+def is_constant(leaf):
+    # operations created inside `no_grad` have no incoming nodes and keep their output
+    return isinstance(leaf, (Constant, Node))
+
+
+def simplify_instructions(instructions, leaves, output_slot):
+    """Folds the operations whose inputs are all constants and merges the
+    operations that compute the same output from the same inputs.
+
+    `instructions` is a topologically ordered list of `(node, input slots, output slot)`
+    and `leaves` a list of `(slot, leaf)`, returns the new instructions, the
+    `(slot, value)` of the folded operations that are used by the remaining ones
+    or are at `output_slot`, and a dict from the slots that were merged to the slot
+    that replaces them."""
+
+    constants = {}
+    replaced = {}
+    interned = {}
+    for slot, leaf in leaves:
+        if not is_constant(leaf):
+            continue
+        # python numbers are kept as they are, see `Constant`
+        constants[slot] = leaf.data
+        value = np.asarray(leaf.data)
+        if value.size <= _MAX_INTERNED_SIZE:
+            key = (type(leaf.data), value.dtype.str, value.shape, value.tobytes())
+            replaced_by = interned.setdefault(key, slot)
+            if replaced_by != slot:
+                replaced[slot] = replaced_by
+
+    folded = {}
+    merged = {}
+    new_instructions = []
+    for node, input_slots, output_slot in instructions:
+        input_slots = tuple(replaced.get(slot, slot) for slot in input_slots)
+        if all(slot in constants for slot in input_slots):
+            inputs = [constants[slot] for slot in input_slots]
+            with np.errstate(all='ignore'):
+                value = node.compute(*inputs)
+            if np.ndim(value) == 0 and all(isinstance(x, (bool, int, float, complex)) for x in inputs):
+                # the result of python numbers does not promote the arrays either
+                value = value.item()
+            folded[output_slot] = constants[output_slot] = value
+            continue
+        key = node.key()
+        if key is not None:
+            key = (key, tuple(sorted(input_slots)) if node.commutative else input_slots)
+            merged_into = merged.setdefault(key, output_slot)
+            if merged_into != output_slot:
+                replaced[output_slot] = merged_into
+                continue
+        new_instructions.append((node, input_slots, output_slot))
+
+    used = {slot for _, input_slots, _ in new_instructions for slot in input_slots}
+    used.add(replaced.get(output_slot, output_slot))
+    folded_values = [(slot, value) for slot, value in folded.items() if slot in used]
+    return new_instructions, folded_values, replaced
@@ -1 +1,855 @@
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
 import unittest
+import weakref
+
+import numpy as np
+
+import autograd
+from autograd import backend
+from autograd.exceptions import NoPathFoundError, PlaceholderNotAssignedError, ShapeError
+
+
+def finite_difference_gradients(output, params, eps=1e-6):
+    gradients = []
+    for param in params:
+        initial = param.data.copy()
+        grads = np.zeros(initial.shape)
+        for i in np.ndindex(initial.shape):
+            for sign in (1., -1.):
+                shifted = initial.copy()
+                shifted[i] += sign * eps
+                param._data = shifted
+                grads[i] += sign * output.data / (2 * eps)
+        param._data = initial
+        gradients.append(grads)
+    return gradients
+
+
+def variables(*shapes, seed=1):
+    rng = np.random.default_rng(seed)
+    return [autograd.Variable(rng.normal(size=shape), dtype=np.float64) for shape in shapes]
+
+
+class MemoizationTest(unittest.TestCase):
+    def test_only_the_outputs_of_written_leaves_are_recomputed(self):
+        calls = []
+
+        class double(autograd.Node):
+            elementwise = True
+            __slots__ = ()
+
+            def __init__(self, x):
+                super().__init__([x])
+
+            def compute(self, x):
+                calls.append(x)
+                return x * 2.
+
+        x = autograd.Variable(np.ones(2))
+        y = autograd.Placeholder()
+        output = double(x) + y
+        # the dtype is inferred by computing one element
+        calls.clear()
+        y.assign(np.ones(2))
+        np.testing.assert_array_equal(output.data, [3., 3.])
+        np.testing.assert_array_equal(output.data, [3., 3.])
+        self.assertEqual(len(calls), 1)
+        y.assign(np.zeros(2))
+        np.testing.assert_array_equal(output.data, [2., 2.])
+        self.assertEqual(len(calls), 1)
+        x._data = np.full(2, 2., dtype=x.dtype)
+        np.testing.assert_array_equal(output.data, [4., 4.])
+        self.assertEqual(len(calls), 2)
+
+
+class BackwardTest(unittest.TestCase):
+    def test_every_leaf_in_one_pass(self):
+        x, y = variables((2, 3), (2, 3))
+        shared = autograd.sin(x * y)
+        output = autograd.sum(shared * shared + autograd.exp(shared) * x)
+        expected = finite_difference_gradients(output, [x, y])
+        output.backward()
+        np.testing.assert_allclose(x.gradients, expected[0], rtol=1e-6)
+        np.testing.assert_allclose(y.gradients, expected[1], rtol=1e-6)
+        backend.reset_gradients()
+        output.backward([y])
+        np.testing.assert_allclose(y.gradients, expected[1], rtol=1e-6)
+        self.assertEqual(x.gradients, 0.)
+
+
+class TensorGradientTest(unittest.TestCase):
+    def assert_gradients(self, output, params):
+        expected = finite_difference_gradients(output, params)
+        output.backward(params)
+        for param, expected_grads in zip(params, expected):
+            self.assertEqual(param.gradients.shape, param.shape)
+            np.testing.assert_allclose(param.gradients, expected_grads, rtol=1e-5, atol=1e-8)
+
+    def test_matmul(self):
+        for x_shape, y_shape in [((2, 3), (3, 4)), ((3,), (3, 4)), ((2, 3), (3,)), ((2, 2, 3), (3, 4)), ((1, 2, 3), (2, 3, 4))]:
+            x, y = variables(x_shape, y_shape)
+            self.assert_gradients(autograd.sum(autograd.sin(autograd.matmul(x, y))), [x, y])
+
+    def test_dot(self):
+        for x_shape, y_shape in [((2, 3), (3, 4)), ((3,), (3,)), ((2, 3, 4), (5, 4, 2)), ((), (2, 3))]:
+            x, y = variables(x_shape, y_shape)
+            self.assert_gradients(autograd.sum(autograd.sin(autograd.dot(x, y))), [x, y])
+
+    def test_broadcasting(self):
+        x, y, z = variables((2, 3), (3,), (2, 1))
+        self.assert_gradients(autograd.sum(autograd.sin(x + y) * z / (y * y + 1.) - z), [x, y, z])
+
+
+class TraversalTest(unittest.TestCase):
+    def test_growing_chain(self):
+        x = autograd.Variable(np.ones(2))
+        c = x
+        for i in range(3 * sys.getrecursionlimit()):
+            c = c * 1. + 1.
+            if i % 100 == 0:
+                c.data
+        np.testing.assert_array_equal(c.data, np.full(2, 3. * sys.getrecursionlimit() + 1.))
+        # only the backward pass caches the order of the graph
+        self.assertIsNone(c.cached_graphs)
+        x._data = np.zeros(2, dtype=x.dtype)
+        np.testing.assert_array_equal(c.data, np.full(2, 3. * sys.getrecursionlimit()))
+
+
+class GraphObjectTest(unittest.TestCase):
+    def test_slots(self):
+        x = autograd.Variable(1.)
+        for obj in (x, x * 2., autograd.sigmoid(x), autograd.Placeholder(), autograd.Constant(1.)):
+            self.assertFalse(hasattr(obj, '__dict__'), type(obj))
+
+    def test_instance_tracking_is_opt_in(self):
+        x = autograd.Variable(1.)
+        output = x * 2.
+        self.assertNotIn(x, autograd.Variable.instances)
+        self.assertNotIn(output, autograd.Node.instances)
+        backend.enable_instance_tracking(True)
+        try:
+            y = autograd.Variable(1.)
+            output = y * 2.
+        finally:
+            backend.enable_instance_tracking(False)
+        self.assertIn(y, autograd.Variable.instances)
+        self.assertIn(output, autograd.Node.instances)
+
+
+class NoGradTest(unittest.TestCase):
+    def test_operations_are_computed_eagerly_without_edges(self):
+        w = autograd.Variable(np.ones(2))
+        with autograd.no_grad():
+            output = autograd.sigmoid(w * 2.)
+            with autograd.no_grad():
+                pass
+            self.assertFalse(backend.grad_enabled())
+        self.assertTrue(backend.grad_enabled())
+        self.assertEqual(output.incoming_nodes, [])
+        self.assertEqual(w.outcoming_nodes, [])
+        np.testing.assert_allclose(output.data, 1. / (1. + np.exp(-2.)) * np.ones(2), rtol=1e-6)
+        # the writes after it do not change it
+        w._data = np.zeros(2, dtype=w.dtype)
+        np.testing.assert_allclose(output.data, 1. / (1. + np.exp(-2.)) * np.ones(2), rtol=1e-6)
+
+    def test_decorator(self):
+        w = autograd.Variable(np.ones(2))
+
+        @autograd.no_grad()
+        def predict(x):
+            if x is None:
+                raise ValueError
+            return w * x
+
+        self.assertEqual(predict(2.).incoming_nodes, [])
+        with self.assertRaises(ValueError):
+            predict(None)
+        self.assertTrue(backend.grad_enabled())
+        self.assertEqual(len((w * 2.).incoming_nodes), 2)
+
+
+class GraphReleaseTest(unittest.TestCase):
+    def test_step_graphs_are_released(self):
+        w = autograd.Variable(np.ones(2))
+        for _ in range(100):
+            loss = autograd.sum(autograd.sigmoid(w * 2.) * w)
+            loss.backward(w)
+            released = weakref.ref(loss)
+            backend.sgd_update([w])
+        del loss
+        self.assertIsNone(released())
+        self.assertEqual(w.outcoming_nodes, [])
+        # the dead references are dropped as new ones are added
+        self.assertLess(len(w._outcoming_nodes), 16)
+
+    def test_used_graphs_are_kept(self):
+        w = autograd.Variable(np.ones(2))
+        hidden = w * 2.
+        output = autograd.sum(hidden)
+        del hidden
+        self.assertEqual(len(w.outcoming_nodes), 1)
+        output.backward(w)
+        np.testing.assert_array_equal(w.gradients, [2., 2.])
+
+
+class GradientBufferTest(unittest.TestCase):
+    def test_gradients_are_a_read_only_view_of_the_buffer(self):
+        x = autograd.Variable(2.)
+        (x * x).backward(x)
+        gradients = x.gradients
+        kept = np.array(x.gradients)
+        with self.assertRaises(ValueError):
+            gradients += 1.
+        (x * x + x).backward(x)
+        # the buffer is reused by the next pass
+        self.assertEqual(gradients, 5.)
+        self.assertEqual(kept, 4.)
+        backend.reset_leaf_gradients()
+        self.assertEqual(x.gradients, 0.)
+
+    def test_buffers_are_reused_across_passes(self):
+        x = autograd.Variable(np.ones(3))
+        output = autograd.sum(x * x + x)
+        output.backward(x)
+        buffer = x._gradients
+        for _ in range(3):
+            output.backward(x)
+        self.assertIs(x._gradients, buffer)
+        np.testing.assert_array_equal(x.gradients, np.full(3, 3.))
+        backend.reset_gradients()
+        self.assertEqual(x.gradients, 0.)
+        output.backward(x)
+        self.assertIs(x._gradients, buffer)
+        np.testing.assert_array_equal(x.gradients, np.full(3, 3.))
+
+
+class CompositeTest(unittest.TestCase):
+    def test_composite_operations_are_inlined(self):
+        x, = variables((3,))
+        s = autograd.sigmoid(x)
+        output = autograd.sum(s * 2.)
+        self.assertIs(output.incoming_nodes[0].incoming_nodes[0], s.get_output_node())
+        self.assertNotIn(s, autograd.Session(output)._slots)
+        output.backward(x)
+        expected = 1. / (1. + np.exp(-x.data))
+        np.testing.assert_allclose(s.data, expected)
+        np.testing.assert_allclose(x.gradients, 2. * expected * (1. - expected))
+        s.backward(x)
+        np.testing.assert_allclose(x.gradients, expected * (1. - expected))
+
+
+class FusionTest(unittest.TestCase):
+    def assert_fused_like_unfused(self, output, feed_dict={}, with_respect=None):
+        for plan_memory in (False, True):
+            fused = autograd.Session(output, plan_memory=plan_memory).run(feed_dict, with_respect=with_respect)
+            unfused = autograd.Session(output, fuse=False, plan_memory=plan_memory).run(feed_dict, with_respect=with_respect)
+            if with_respect is not None:
+                (fused, fused_grads), (unfused, unfused_grads) = fused, unfused
+                for a, b in zip(fused_grads, unfused_grads):
+                    np.testing.assert_allclose(a, b)
+            self.assertEqual(np.result_type(fused), np.result_type(unfused))
+            np.testing.assert_allclose(fused, unfused)
+
+    def test_chain(self):
+        x = autograd.Variable(np.linspace(-1., 1., 6).reshape(2, 3))
+        y = autograd.Variable(np.linspace(0.5, 1., 3))
+        output = autograd.sin(autograd.exp(x) * y + 1.) / (y + 2.)
+        self.assert_fused_like_unfused(output, with_respect=[x, y])
+        fused = autograd.Session(output)
+        self.assertLess(len(fused._instructions), len(autograd.Session(output, fuse=False)._instructions))
+
+    def test_promoted_dtype(self):
+        w = autograd.Variable(np.ones(3), dtype=np.float32)
+        p = autograd.Placeholder(dtype=np.float64)
+        output = autograd.exp(w) * p + 1e-9
+        self.assert_fused_like_unfused(output, {p: np.full(3, 1. / 3.)})
+
+    def test_power_widens_shape(self):
+        x = autograd.Variable(np.array([0.1, 0.2, 0.3]))
+        output = autograd.exp(x) ** np.ones((2, 3))
+        self.assert_fused_like_unfused(output, with_respect=[x])
+
+
+class DtypeTest(unittest.TestCase):
+    def test_default_dtype(self):
+        x = autograd.Variable([1, 2])
+        self.assertEqual(x.dtype, np.float32)
+        self.assertEqual((x * 2.5 + 1).data.dtype, np.float32)
+        self.assertEqual(autograd.Variable(np.ones(2), dtype=np.float64).dtype, np.float64)
+        with self.assertRaises(ValueError):
+            backend.set_default_dtype(np.int32)
+
+    def test_half_precision_storage(self):
+        previous = backend.set_default_dtype(np.float16)
+        try:
+            x = autograd.Variable(np.linspace(0., 1., 3))
+            loss = autograd.sum(autograd.sigmoid(x * 2.) * x)
+        finally:
+            backend.set_default_dtype(previous)
+        self.assertEqual(x.dtype, np.float16)
+        self.assertEqual(loss.data.dtype, np.float16)
+        loss.backward(x)
+        self.assertEqual(x.gradients.dtype, np.float32)
+        _, (grads,) = autograd.Session(loss).run(with_respect=[x])
+        self.assertEqual(grads.dtype, np.float32)
+        np.testing.assert_allclose(grads, x.gradients, rtol=1e-3)
+
+
+class PlaceholderTest(unittest.TestCase):
+    def test_shape(self):
+        x = autograd.Placeholder(shape=(None, 3))
+        self.assertEqual(x.shape, (None, 3))
+        x.assign(np.ones((2, 3)))
+        self.assertEqual(x.shape, (2, 3))
+        with self.assertRaises(PlaceholderNotAssignedError):
+            autograd.Placeholder().shape
+
+    def test_default_dtype(self):
+        x = autograd.Placeholder()
+        self.assertEqual(x.assign(2.0).data.dtype, autograd.Variable(2.0).data.dtype)
+        w = autograd.Variable(np.ones(3))
+        output = autograd.Session(autograd.sum(x * w)).run({x: np.ones(3)})
+        self.assertEqual(np.result_type(output), w.data.dtype)
+        declared = autograd.Placeholder(dtype=np.float64)
+        self.assertEqual(declared.validate(np.ones(2)).dtype, np.float64)
+
+
+class StaticShapeTest(unittest.TestCase):
+    def test_inferred_without_the_forward(self):
+        x = autograd.Placeholder(shape=(None, 3), dtype=np.float64)
+        w = autograd.Variable(np.ones((3, 2)), dtype=np.float32)
+        hidden = autograd.relu(autograd.matmul(x, w) + autograd.Variable(np.ones(2)))
+        self.assertEqual(hidden.static_shape, (None, 2))
+        self.assertEqual(hidden.dtype, np.float64)
+        self.assertEqual(autograd.sum(hidden).shape, ())
+        self.assertEqual(autograd.transpose(hidden).static_shape, (2, None))
+        self.assertFalse(x.assigned)
+        with self.assertRaises(ShapeError):
+            autograd.matmul(x, autograd.Variable(np.ones((2, 2))))
+        with self.assertRaises(ShapeError):
+            hidden + autograd.Variable(np.ones(3))
+
+    def test_dependents_of_a_reassigned_variable(self):
+        v = autograd.Variable(np.ones(3))
+        output = autograd.sigmoid(v * 2.)
+        session = autograd.Session(output, plan_memory=True)
+        v._data = np.ones(5, dtype=np.float64)
+        self.assertEqual(output.shape, (5,))
+        self.assertEqual(output.dtype, np.float64)
+        value, (grads,) = session.run(with_respect=[v])
+        self.assertEqual(value.dtype, np.float64)
+        self.assertEqual(grads.shape, (5,))
+
+
+def finite_difference_hvp(build, params, vectors, eps=1e-6):
+    def gradients(values):
+        for param, value in zip(params, values):
+            param._data = value
+        build().backward(params)
+        return [np.array(param.gradients) for param in params]
+
+    initial = [param.data.copy() for param in params]
+    plus = gradients([value + eps * v for value, v in zip(initial, vectors)])
+    minus = gradients([value - eps * v for value, v in zip(initial, vectors)])
+    for param, value in zip(params, initial):
+        param._data = value
+    return [(a - b) / (2 * eps) for a, b in zip(plus, minus)]
+
+
+class HessianVectorProductTest(unittest.TestCase):
+    def assert_hvp(self, build, params):
+        rng = np.random.default_rng(0)
+        vectors = [rng.normal(size=param.shape) for param in params]
+        products = autograd.hvp(build(), params, vectors)
+        for product, expected in zip(products, finite_difference_hvp(build, params, vectors)):
+            np.testing.assert_allclose(product, expected, rtol=1e-5, atol=1e-6)
+
+    def test_create_graph(self):
+        x, = variables((3,))
+        gradients = autograd.sum(x ** 3 + autograd.sin(x)).backward(x, create_graph=True)
+        np.testing.assert_allclose(x.gradients, 3 * x.data ** 2 + np.cos(x.data))
+        np.testing.assert_allclose(gradients.data, x.gradients)
+        autograd.sum(gradients).backward(x)
+        np.testing.assert_allclose(x.gradients, 6 * x.data - np.sin(x.data))
+
+    def test_elementwise(self):
+        x, y = variables((2, 3), (3,))
+        self.assert_hvp(lambda: autograd.sum(autograd.sin(x * y) / (y * y + 1.) + autograd.exp(x) ** 2), [x, y])
+
+    def test_matmul_vector_and_stacked_matrices(self):
+        v, m = variables((3,), (2, 3, 4))
+        self.assert_hvp(lambda: autograd.sum(autograd.sin(autograd.matmul(v, m))), [v, m])
+        w, u = variables((2, 4, 3), (3,))
+        self.assert_hvp(lambda: autograd.sum(autograd.cos(autograd.matmul(w, u))), [w, u])
+
+    def test_dot_of_stacked_operands(self):
+        x, y = variables((2, 3, 4), (5, 4, 2))
+        self.assert_hvp(lambda: autograd.sum(autograd.sin(autograd.dot(x, y))), [x, y])
+        v, = variables((4,))
+        self.assert_hvp(lambda: autograd.sum(autograd.sin(autograd.dot(x, v))), [x, v])
+
+    def test_checkpoint(self):
+        x, w = variables((2, 3), (3, 3))
+
+        def block(h):
+            return autograd.sin(autograd.matmul(h, w))
+
+        self.assert_hvp(lambda: autograd.sum(autograd.checkpoint(block, autograd.checkpoint(block, x)) ** 2), [x, w])
+
+
+class ForwardModeTest(unittest.TestCase):
+    def build(self, x, w):
+        hidden = autograd.sigmoid(autograd.matmul(x, w)) / (autograd.cosh(autograd.sum(x)) + 1.)
+        hidden = autograd.transpose(autograd.relu(hidden) + autograd.sinh(hidden) ** 2)
+        scale = autograd.dot(autograd.broadcast_to(autograd.sum(w), (3,)), autograd.sum_to(w, (3, 1)))
+        return autograd.reshape(hidden, (4,)) * scale
+
+    def test_jvp_is_the_gradients_along_the_tangents(self):
+        x, w = variables((2, 3), (3, 2))
+        rng = np.random.default_rng(10)
+        tangents = {x: rng.normal(size=(2, 3)), w: rng.normal(size=(3, 2))}
+        loss = autograd.sum(autograd.sin(self.build(x, w)))
+        value, tangent = autograd.jvp(loss, tangents)
+        loss.backward([x, w])
+        np.testing.assert_allclose(value, loss.data)
+        np.testing.assert_allclose(tangent, np.sum(x.gradients * tangents[x]) + np.sum(w.gradients * tangents[w]))
+
+    def test_jacobian(self):
+        x, w = variables((2, 3), (3, 2))
+        output = self.build(x, w)
+        for leaf in (x, w):
+            jacobian = autograd.jacobian(output, leaf)
+            self.assertEqual(jacobian.shape, (4,) + leaf.shape)
+            for i, row in enumerate(np.eye(4)):
+                expected, = finite_difference_gradients(autograd.dot(output, autograd.Constant(row)), [leaf])
+                np.testing.assert_allclose(jacobian[i], expected, rtol=1e-5, atol=1e-8)
+
+    def test_checkpoint(self):
+        rng = np.random.default_rng(2)
+        x = autograd.Variable(rng.normal(size=(2, 3)), dtype=np.float64)
+        w = autograd.Variable(rng.normal(size=(3, 3)), dtype=np.float64)
+
+        def block(h):
+            return autograd.sin(autograd.matmul(h, w))
+
+        output = autograd.checkpoint(block, autograd.checkpoint(block, x)) * 2.
+        expected = autograd.sin(autograd.matmul(autograd.sin(autograd.matmul(x, w)), w)) * 2.
+        tangents = {x: rng.normal(size=(2, 3)), w: rng.normal(size=(3, 3))}
+        np.testing.assert_allclose(autograd.jvp(output, tangents)[1], autograd.jvp(expected, tangents)[1])
+        for leaf in (x, w):
+            np.testing.assert_allclose(autograd.jacobian(output, leaf), autograd.jacobian(expected, leaf))
+
+
+class VmapTest(unittest.TestCase):
+    def test_same_results_as_per_example_runs(self):
+        w, b = variables((3, 2), (2,))
+        x = autograd.Placeholder(shape=(3,))
+        y = autograd.Placeholder(shape=())
+        output = autograd.sum(autograd.relu(autograd.matmul(x, w) + b) * y + autograd.sin(autograd.dot(x, x)))
+        rng = np.random.default_rng(7)
+        feed_dict = {x: rng.normal(size=(5, 3)), y: rng.normal(size=5)}
+        batched = autograd.vmap(output, [x, y])
+        outputs, grads = batched.run(feed_dict, with_respect=[w, b])
+        _, per_example = batched.run(feed_dict, with_respect=[w, b], per_example=True)
+        session = autograd.Session(output)
+        runs = [session.run({x: xs, y: ys}, with_respect=[w, b]) for xs, ys in zip(feed_dict[x], feed_dict[y])]
+        np.testing.assert_allclose(outputs, [value for value, _ in runs], rtol=1e-6)
+        for i in range(2):
+            np.testing.assert_allclose(per_example[i], [g[i] for _, g in runs], rtol=1e-5, atol=1e-7)
+            np.testing.assert_allclose(grads[i], np.sum([g[i] for _, g in runs], axis=0), rtol=1e-5, atol=1e-7)
+
+    def test_batch_sizes(self):
+        x, y = autograd.Placeholder(), autograd.Placeholder()
+        batched = autograd.vmap(x * y, [x, y])
+        with self.assertRaises(ValueError):
+            batched.run({x: np.ones(3), y: np.ones(4)})
+        with self.assertRaises(ValueError):
+            batched.run({x: np.ones(3)})
+
+
+class MemoryPlanTest(unittest.TestCase):
+    def test_same_results_as_session(self):
+        w1, w2 = variables((3, 4), (4, 2))
+        x = autograd.Placeholder(shape=(None, 3))
+        output = autograd.sum(autograd.sigmoid(autograd.matmul(autograd.relu(autograd.matmul(x, w1)), w2)) ** 2)
+        feed_dict = {x: np.random.default_rng(8).normal(size=(5, 3))}
+        expected, expected_grads = autograd.Session(output).run(feed_dict, with_respect=[w1, w2])
+        session = autograd.Session(output, plan_memory=True)
+        for _ in range(2):
+            value, grads = session.run(feed_dict, with_respect=[w1, w2])
+            np.testing.assert_allclose(value, expected)
+            for g, expected_g in zip(grads, expected_grads):
+                np.testing.assert_allclose(g, expected_g)
+        np.testing.assert_allclose(session.run(feed_dict), expected)
+
+    def test_intermediates_are_released(self):
+        x = autograd.Variable(np.ones(100000))
+        output = x
+        for _ in range(20):
+            output = autograd.sin(output)
+
+        def peak(session):
+            tracemalloc.start()
+            try:
+                session.run()
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        unplanned = peak(autograd.Session(output, fuse=False))
+        planned = peak(autograd.Session(output, fuse=False, plan_memory=True))
+        self.assertLess(planned, unplanned / 4)
+
+
+class CheckpointTest(unittest.TestCase):
+    def test_same_gradients_as_the_graph(self):
+        x, w, b = variables((2, 3), (3, 3), (3,))
+
+        def block(h):
+            return autograd.sigmoid(autograd.matmul(h, w) + b)
+
+        checkpointed = plain = x
+        for _ in range(4):
+            checkpointed = autograd.checkpoint(block, checkpointed)
+            plain = block(plain)
+        checkpointed, plain = autograd.sum(checkpointed * checkpointed), autograd.sum(plain * plain)
+        np.testing.assert_allclose(checkpointed.data, plain.data)
+        expected = autograd.Session(plain).run(with_respect=[x, w, b])[1]
+        checkpointed.backward([x, w, b])
+        for leaf, expected_grads in zip((x, w, b), expected):
+            np.testing.assert_allclose(leaf.gradients, expected_grads)
+        for grads, expected_grads in zip(autograd.Session(checkpointed).run(with_respect=[x, w, b])[1], expected):
+            np.testing.assert_allclose(grads, expected_grads)
+
+    def test_vmap(self):
+        rng = np.random.default_rng(3)
+        w = autograd.Variable(rng.normal(size=(3, 2)))
+        x = autograd.Placeholder(shape=(3,))
+
+        def block(h):
+            return autograd.sin(autograd.matmul(h, w))
+
+        output = autograd.sum(autograd.checkpoint(block, x))
+        batch = rng.normal(size=(4, 3))
+        outputs, (grads,) = autograd.vmap(output, [x]).run({x: batch}, with_respect=[w])
+        session = autograd.Session(output)
+        runs = [session.run({x: example}, with_respect=[w]) for example in batch]
+        np.testing.assert_allclose(outputs, [value for value, _ in runs], rtol=1e-6)
+        np.testing.assert_allclose(grads, np.sum([g for _, (g,) in runs], axis=0), rtol=1e-5)
+
+
+class OptimizerTest(unittest.TestCase):
+    def assert_steps(self, make_optimizer, update, steps=3):
+        w, b = variables((3, 2), (2,))
+        loss = autograd.sum(autograd.sin(autograd.matmul(autograd.Variable(np.ones((4, 3))), w) + b) ** 2)
+        optimizer = make_optimizer([w, b])
+        expected = [w.data.copy(), b.data.copy()]
+        state = {}
+        for t in range(1, steps + 1):
+            loss.backward([w, b])
+            grads = [np.array(w.gradients), np.array(b.gradients)]
+            optimizer.step()
+            expected = update(expected, grads, state, t)
+            np.testing.assert_allclose(w.data, expected[0], rtol=1e-6)
+            np.testing.assert_allclose(b.data, expected[1], rtol=1e-6)
+
+    def test_sgd(self):
+        def update(params, grads, state, t):
+            velocity = state.setdefault('velocity', [np.zeros_like(g) for g in grads])
+            for v, g in zip(velocity, grads):
+                v *= 0.9
+                v += g
+            return [p - 0.1 * (g + 0.9 * v) for p, g, v in zip(params, grads, velocity)]
+
+        self.assert_steps(lambda weights: autograd.SGD(weights, lr=0.1, momentum=0.9, nesterov=True), update)
+
+    def test_adam(self):
+        def update(params, grads, state, t):
+            m = state.setdefault('m', [np.zeros_like(g) for g in grads])
+            v = state.setdefault('v', [np.zeros_like(g) for g in grads])
+            result = []
+            for p, g, m_, v_ in zip(params, grads, m, v):
+                m_[...] = 0.9 * m_ + 0.1 * g
+                v_[...] = 0.999 * v_ + 0.001 * g ** 2
+                m_hat, v_hat = m_ / (1 - 0.9 ** t), v_ / (1 - 0.999 ** t)
+                result.append(p - 0.01 * m_hat / (np.sqrt(v_hat) + 1e-8))
+            return result
+
+        self.assert_steps(lambda weights: autograd.Adam(weights, lr=0.01), update)
+
+    def test_rmsprop_with_weight_decay_and_clipping(self):
+        def update(params, grads, state, t):
+            grads = [g + 0.01 * p for p, g in zip(params, grads)]
+            norm = np.sqrt(np.sum([np.sum(g ** 2) for g in grads]))
+            grads = [g * min(1., 0.5 / norm) for g in grads]
+            mean_square = state.setdefault('mean_square', [np.zeros_like(g) for g in grads])
+            for s, g in zip(mean_square, grads):
+                s[...] = 0.9 * s + 0.1 * g ** 2
+            return [p - 0.01 * g / (np.sqrt(s) + 1e-8) for p, g, s in zip(params, grads, mean_square)]
+
+        self.assert_steps(
+            lambda weights: autograd.RMSProp(weights, lr=0.01, weight_decay=0.01, clip_norm=0.5), update)
+
+    def test_reassigned_weights_are_updated(self):
+        w = autograd.Variable(np.ones(3))
+        optimizer = autograd.SGD([w], lr=0.5)
+        w._data = np.full(3, 2., dtype=w.data.dtype)
+        autograd.sum(w * w).backward(w)
+        optimizer.step()
+        np.testing.assert_allclose(w.data, np.zeros(3))
+        # the weight is packed again, so the next steps update it in place
+        autograd.sum(w * w + w).backward(w)
+        optimizer.step()
+        np.testing.assert_allclose(w.data, np.full(3, -0.5))
+
+    def test_dtypes(self):
+        half = autograd.Variable(np.ones(3), dtype=np.float16)
+        single = autograd.Variable(np.ones(3), dtype=np.float32)
+        with self.assertRaises(ValueError):
+            autograd.SGD([half, single])
+        optimizer = autograd.SGD([half], lr=0.5)
+        autograd.sum(half * half).backward(half)
+        optimizer.step()
+        self.assertEqual(half.data.dtype, np.float16)
+        self.assertEqual(half.gradients.dtype, np.float32)
+        np.testing.assert_array_equal(half.data, np.zeros(3))
+
+
+class SessionTest(unittest.TestCase):
+    def test_same_results_as_the_nodes(self):
+        w, b = variables((3, 2), (2,))
+        x = autograd.Placeholder(shape=(None, 3))
+        output = autograd.sum(autograd.sigmoid(autograd.matmul(x, w) + b))
+        session = autograd.Session(output)
+        rng = np.random.default_rng(6)
+        for batch in (rng.normal(size=(4, 3)), rng.normal(size=(2, 3))):
+            value, (w_grads, b_grads) = session.run({x: batch}, with_respect=[w, b])
+            x.assign(batch)
+            output.backward([w, b])
+            np.testing.assert_allclose(value, output.data)
+            np.testing.assert_allclose(w_grads, w.gradients)
+            np.testing.assert_allclose(b_grads, b.gradients)
+
+    def test_invalid_arguments(self):
+        x = autograd.Placeholder()
+        w, unused = variables((), ())
+        session = autograd.Session(x * w)
+        with self.assertRaises(ValueError):
+            session.run({w: 1.})
+        with self.assertRaises(NoPathFoundError):
+            session.run({x: 1.}, with_respect=[unused])
+
+    def test_seed_has_the_shape_of_the_output(self):
+        x = autograd.Variable(np.array([1., 2.]))
+        output = x * 1.
+        for session in (autograd.Session(output), autograd.ParallelSession(output)):
+            with session:
+                _, (grads,) = session.run(with_respect=[x])
+            np.testing.assert_array_equal(grads, np.ones(2))
+        _, (grads,) = autograd.compile(output, wrt=[x])()
+        np.testing.assert_array_equal(grads, np.ones(2))
+
+    def test_gradients_accumulate_without_reset(self):
+        v = autograd.Variable(np.array([1., 2.]))
+        loss = autograd.sum(v * 3.)
+        session = autograd.Session(loss)
+        backend.enable_reset_gradients(False)
+        try:
+            backend.reset_gradients()
+            session.run(with_respect=[v])
+            session.run(with_respect=[v])
+            np.testing.assert_array_equal(v.gradients, [6., 6.])
+            loss.backward(v)
+            np.testing.assert_array_equal(v.gradients, [9., 9.])
+        finally:
+            backend.enable_reset_gradients(True)
+        session.run(with_respect=[v])
+        np.testing.assert_array_equal(v.gradients, [3., 3.])
+
+
+class SimplificationTest(unittest.TestCase):
+    def test_operations_with_attributes_are_not_merged(self):
+        class scale(autograd.Node):
+            elementwise = True
+            __slots__ = ('factor',)
+
+            def __init__(self, x, factor):
+                self.factor = factor
+                super().__init__([x])
+
+            def compute(self, x):
+                return x * self.factor
+
+        x = autograd.Variable(np.ones(2))
+        output = scale(x, 2.) + scale(x, 3.)
+        np.testing.assert_array_equal(autograd.Session(output).run(), [5., 5.])
+        np.testing.assert_array_equal(autograd.compile(output)(), [5., 5.])
+
+    def test_constant_subgraphs_are_folded(self):
+        x = autograd.Variable(np.ones(2, dtype=np.float32))
+        scale = autograd.exp(autograd.Constant(np.full(2, 0.5))) * 2.
+        output = x * scale + x * 1.
+        session = autograd.Session(output, fuse=False)
+        # `exp(0.5) * 2.` is computed once, `1.` stays a python number
+        self.assertEqual([type(op) for op, _, _ in session._instructions],
+                         [autograd.multiply, autograd.multiply, autograd.add])
+        value, (grads,) = session.run(with_respect=[x])
+        np.testing.assert_allclose(value, np.exp(0.5) * 2. + 1.)
+        np.testing.assert_allclose(grads, np.exp(0.5) * 2. + 1.)
+        self.assertEqual(autograd.Session(x * 1. + 2.).run().dtype, np.float32)
+
+    def test_stateless_operations_are_merged(self):
+        x = autograd.Variable(np.ones(2))
+        output = autograd.exp(x) * autograd.exp(x)
+        session = autograd.Session(output, fuse=False)
+        self.assertEqual(len(session._instructions), 2)
+        np.testing.assert_allclose(session.run(), np.exp(2.) * np.ones(2), rtol=1e-6)
+
+
+class ParallelSessionTest(unittest.TestCase):
+    def test_same_results_as_session(self):
+        rng = np.random.default_rng(4)
+        x = autograd.Placeholder(shape=(None, 3))
+        weights = [autograd.Variable(rng.normal(size=(3, 2))) for _ in range(4)]
+        a, b, c, d = [autograd.relu(autograd.matmul(x, w)) for w in weights]
+        output = autograd.sum(a * b + autograd.sin(c) - d ** 2)
+        feed_dict = {x: rng.normal(size=(5, 3))}
+        expected, expected_grads = autograd.Session(output).run(feed_dict, with_respect=weights, output_gradients=2.)
+        with autograd.ParallelSession(output, max_workers=4) as session:
+            runs = [session.run(feed_dict, with_respect=weights, output_gradients=2.)]
+            with autograd.profile() as prof:
+                runs.append(session.run(feed_dict, with_respect=weights, output_gradients=2.))
+        for value, grads in runs:
+            np.testing.assert_allclose(value, expected, rtol=1e-6)
+            for g, expected_g in zip(grads, expected_grads):
+                np.testing.assert_allclose(g, expected_g, rtol=1e-5)
+        self.assertEqual({event.phase for event in prof.events}, {'forward', 'backward'})
+
+
+class DataParallelTest(unittest.TestCase):
+    def test_same_gradients_as_session(self):
+        w, b = variables((3, 2), (2,))
+        x = autograd.Placeholder(shape=(None, 3))
+        y = autograd.Placeholder(shape=(None, 2))
+        loss = autograd.sum((autograd.sigmoid(autograd.matmul(x, w) + b) - y) ** 2)
+        rng = np.random.default_rng(9)
+        # 7 examples are not split evenly and the last shards of the small batch are empty
+        for size in (7, 2):
+            feed_dict = {x: rng.normal(size=(size, 3)), y: rng.normal(size=(size, 2))}
+            expected, expected_grads = autograd.Session(loss).run(feed_dict, with_respect=[w, b])
+            initial = [w.data.copy(), b.data.copy()]
+            with autograd.DataParallel(loss, [w, b], num_workers=3) as trainer:
+                value, grads = trainer.run(feed_dict)
+                trainer.step(feed_dict, lr=0.1)
+            np.testing.assert_allclose(value, expected, rtol=1e-5)
+            for leaf, start, g, expected_g in zip((w, b), initial, grads, expected_grads):
+                np.testing.assert_allclose(g, expected_g, rtol=1e-5, atol=1e-7)
+                # the weights keep the update after the workers are closed
+                np.testing.assert_allclose(leaf.data, start - 0.1 * expected_g, rtol=1e-5, atol=1e-7)
+
+
+class ProfilerTest(unittest.TestCase):
+    def test_events_and_chrome_trace(self):
+        w, = variables((3, 2))
+        x = autograd.Placeholder(shape=(None, 3))
+        loss = autograd.sum(autograd.relu(autograd.matmul(x, w)))
+        session = autograd.Session(loss, fuse=False)
+        with autograd.profile(track_allocations=True) as prof:
+            session.run({x: np.ones((4, 3))}, with_respect=[w])
+            x.assign(np.ones((4, 3)))
+            loss.backward(w)
+        self.assertIsNone(backend.active_profiler())
+        summary = prof.summary()
+        # the session and the nodes ran the three operations
+        self.assertEqual(summary['forward', 'matmul']['calls'], 2)
+        self.assertEqual(summary['backward', 'relu']['calls'], 2)
+        self.assertTrue(all(event.allocated is not None for event in prof.events))
+        self.assertIn('matmul', prof.table())
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'trace.json')
+            prof.export_chrome_trace(path)
+            with open(path) as f:
+                trace = json.load(f)
+        self.assertEqual(len(trace['traceEvents']), len(prof.events))
+        self.assertEqual({event['cat'] for event in trace['traceEvents']}, {'forward', 'backward'})
+        self.assertTrue(all(event['dur'] >= 0 for event in trace['traceEvents']))
+
+
+class BenchmarkTest(unittest.TestCase):
+    def test_compare(self):
+        from benchmarks.run import compare
+        baseline = {'a': {'ops_per_sec': 100., 'peak_bytes': 100, 'num_ops': 10}}
+        results = {'a': {'ops_per_sec': 80., 'peak_bytes': 105, 'num_ops': 20}, 'b': {'ops_per_sec': 1.}}
+        self.assertEqual(compare(results, baseline, 0.1), [('a', 'ops_per_sec', 100., 80.)])
+        self.assertEqual(compare(results, baseline, 0.25), [])
+
+    def test_run_and_compare(self):
+        from benchmarks import run
+        with tempfile.TemporaryDirectory() as directory:
+            output, baseline = os.path.join(directory, 'results.json'), os.path.join(directory, 'baseline.json')
+            with contextlib.redirect_stderr(io.StringIO()):
+                self.assertEqual(run.main(['--quick', '--filter', 'primitive/add', '--output', output]), 0)
+            with open(output) as f:
+                report = json.load(f)
+            self.assertTrue(report['metadata']['quick'])
+            metrics = report['benchmarks']['primitive/add']
+            self.assertGreater(metrics['forward_ops_per_sec'], 0)
+            # a baseline that is much faster is a regression
+            report['benchmarks']['primitive/add'] = {metric: value * 100 for metric, value in metrics.items()}
+            with open(baseline, 'w') as f:
+                json.dump(report, f)
+            with contextlib.redirect_stderr(io.StringIO()) as log:
+                status = run.main(['--quick', '--filter', 'primitive/add', '--output', output, '--compare', baseline])
+            self.assertEqual(status, 1)
+            self.assertIn('regression: primitive/add forward_ops_per_sec', log.getvalue())
+
+
+class CompileTest(unittest.TestCase):
+    def test_straight_line_source(self):
+        w, = variables((3, 2))
+        x = autograd.Placeholder(shape=(None, 3))
+        output = autograd.sum(autograd.relu(autograd.matmul(x, w)))
+        function = autograd.compile(output, inputs=[x], wrt=[w])
+        source = function.source(np.ones((4, 3)))
+        self.assertIn('np.matmul(', source)
+        # the forward pass only calls numpy
+        self.assertNotIn('.compute(', source)
+        for batch in (np.ones((4, 3)), np.ones((2, 3))):
+            value, (grads,) = function(batch)
+            expected, (expected_grads,) = autograd.Session(output).run({x: batch}, with_respect=[w])
+            np.testing.assert_allclose(value, expected)
+            np.testing.assert_allclose(grads, expected_grads)
+
+    def test_graphs_of_the_same_structure_and_other_shapes(self):
+        x = autograd.Variable(np.ones(3))
+        for fn in (lambda h: autograd.broadcast_to(h, (2, 3)) * 2., lambda h: h * 2.):
+            output = autograd.sum(autograd.checkpoint(fn, x))
+            value, (grads,) = autograd.compile(output, wrt=[x])()
+            expected_value, (expected_grads,) = autograd.Session(output).run(with_respect=[x])
+            np.testing.assert_allclose(value, expected_value)
+            np.testing.assert_allclose(grads, expected_grads)
+
+    def test_same_results_as_session(self):
+        rng = np.random.default_rng(5)
+        x = autograd.Placeholder(shape=(None, 3))
+        w = autograd.Variable(rng.normal(size=(3, 2)))
+        with autograd.no_grad():
+            scale = autograd.exp(autograd.Variable(np.full(2, 0.5)))
+        hidden = autograd.matmul(x, w) * (autograd.Constant(2.) * 3.)
+        output = autograd.sum(autograd.sin(hidden) * scale + autograd.sin(hidden))
+        batch = rng.normal(size=(4, 3))
+        for simplify in (True, False):
+            value, (grads,) = autograd.compile(output, inputs=[x], wrt=[w], simplify=simplify)(batch)
+            expected, (expected_grads,) = autograd.Session(output, simplify=simplify).run({x: batch}, with_respect=[w])
+            np.testing.assert_allclose(value, expected, rtol=1e-6)
+            np.testing.assert_allclose(grads, expected_grads, rtol=1e-5)
+
+
+if __name__ == '__main__':
+    unittest.main()
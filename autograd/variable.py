@@ -1,31 +1,96 @@
-import threading
 import weakref
 
 import numpy as np
 
-from autograd.exceptions import PlaceholderNotAssignedError
+from autograd import backend, shapes
+from autograd.exceptions import PlaceholderNotAssignedError, ShapeError
+from autograd.gradients_mixin import GradientsMixin
 from autograd.ops_mixin import OperationsMixin
 
 
-class Leaf:
+class Leaf(GradientsMixin):
+    # only populated if `backend.enable_instance_tracking(True)` was called
     instances = weakref.WeakSet()
-    num_instances = 0
-    def __init__(self, data, name: str = None):
+    # placeholders declare their static shape and dtype instead of taking them from the data
+    _declared = False
+    __slots__ = ('_value', 'version', '_outcoming_nodes', 'counter', '_name', 'static_shape', 'dtype', '__weakref__')
+
+    def __init__(self, data, name: str = None, dtype=None):
         if data is not None:
-            data = np.array(data)
-        self._data = data
-        self.outcoming_nodes = []
-        self.gradients = 0.
-        Leaf.instances.add(self)
-
-        with threading.Lock():
-            Leaf.num_instances += 1
-            self.counter = Leaf.num_instances
-        
-        if name is None:
-            self.name = f'<{self.__class__.__name__.capitalize()}{self.counter}>'
-        else:
-            self.name = name
+            # the default dtype unless `dtype` is passed, see `backend.set_default_dtype`
+            data = backend.as_array(data, dtype)
+        # nothing can depend on a new leaf yet, so the graph version
+        # is only bumped on later writes
+        self._value = data
+        self.version = backend.graph_version()
+        self.static_shape = None if data is None else data.shape
+        self.dtype = None if data is None else data.dtype
+        # weak references to the outcoming operations, see `outcoming_nodes`
+        self._outcoming_nodes = None
+        self._init_gradients()
+        self.counter = next(backend.instance_counter)
+        # the default name is only formatted when it is requested
+        self._name = name
+        if backend.instance_tracking_enabled():
+            Leaf.instances.add(self)
+
+    @property
+    def name(self):
+        if self._name is None:
+            return f'<{self.__class__.__name__.capitalize()}{self.counter}>'
+        return self._name
+
+    @name.setter
+    def name(self, name):
+        self._name = name
+
+    @property
+    def outcoming_nodes(self):
+        """Returns the operations that use this leaf and are still alive,
+        they are referenced weakly so the graphs built from a weight are
+        released after every step without `backend.reset_weights_graph`"""
+        return backend.live_references(self._outcoming_nodes)
+
+    @outcoming_nodes.setter
+    def outcoming_nodes(self, nodes):
+        self._outcoming_nodes = [weakref.ref(node) for node in nodes] or None
+
+    @property
+    def _data(self):
+        return self._value
+
+    @_data.setter
+    def _data(self, value):
+        # every write (`assign`, `w._data += ...` in `sgd_update`) gets a new
+        # version so the cached outputs of the dependent nodes are invalidated.
+        # in-place writes through `.data` bypass this and are not tracked.
+        self._value = value
+        self.version = backend.bump_graph_version()
+        if not self._declared:
+            static_shape, dtype = np.shape(value), np.result_type(value)
+            if static_shape != self.static_shape or dtype != self.dtype:
+                self.static_shape = static_shape
+                self.dtype = dtype
+                self._infer_dependents()
+
+    def _infer_dependents(self):
+        """Infers the static shape and dtype of the operations that depend on
+        this leaf again, they were inferred from its previous value"""
+
+        dependents = set()
+        stack = self.outcoming_nodes
+        while stack:
+            node = stack.pop()
+            if node not in dependents:
+                dependents.add(node)
+                stack.extend(node.outcoming_nodes)
+        # operations are created after their incoming nodes
+        for node in sorted(dependents, key=lambda node: node.counter):
+            try:
+                node._infer_static()
+            except ShapeError:
+                # the value does not fit in the graph, the forward pass reports it
+                node.static_shape = None
 
     @property
     def data(self):
@@ -39,25 +104,94 @@ class Leaf:
 
     @property
     def shape(self):
-        if self.is_placeholder() and not self._assigned:
-            raise ValueError("Placeholder is not initialized yet.")
-        return self._data.shape
+        if self._value is None:
+            # a placeholder that is not assigned yet has the shape it was declared with
+            if self.static_shape is None:
+                raise PlaceholderNotAssignedError(f"{self} is not Assigned yet to a value.")
+            return self.static_shape
+        return self._value.shape
 
     def __repr__(self):
         return self.name
 
 
 class Variable(Leaf, OperationsMixin):
+    __slots__ = ()
+
     def __init__(self, data, **kwargs):
         if data is None:
             raise ValueError("Cannot assign `None` to data.")
         super(Variable, self).__init__(data, **kwargs)
 
 
+class Constant(Variable):
+    """A variable whose value never changes, e.g. the python numbers used in
+    expressions like `x * 2`, the operations that only depend on constants
+    are folded by a `Session`, see `simplification`.
+
+    Arrays and numpy scalars keep their dtype, python numbers are passed
+    to the operations as they are so they take the dtype of the arrays
+    they are combined with, e.g. `x * 2` keeps the dtype of `x`"""
+    __slots__ = ('_scalar',)
+
+    def __init__(self, data, **kwargs):
+        self._scalar = data if isinstance(data, (bool, int, float, complex)) else None
+        kwargs.setdefault('dtype', np.asarray(data).dtype)
+        super().__init__(data, **kwargs)
+        # shared by every graph that uses it
+        self._value.flags.writeable = False
+        if self._scalar is not None:
+            # `Node.infer_dtype` combines the python type with the dtypes of the arrays
+            self.dtype = type(data)
+
+    @property
+    def data(self):
+        return self._value if self._scalar is None else self._scalar
+
+    @property
+    def _data(self):
+        return self._value
+
+    @_data.setter
+    def _data(self, value):
+        raise ValueError(f"{self} is a constant, it can not be assigned.")
+
+
+# python and numpy scalars -> their constant, kept while a graph uses it
+_constants = weakref.WeakValueDictionary()
+
+
+def constant(value):
+    """Returns a `Constant` of `value`, scalars are interned so every `1.0`
+    in the expressions of a graph is the same leaf"""
+    if not isinstance(value, (bool, int, float, complex, np.generic)):
+        return Constant(value)
+    # `repr` tells apart equal values of different types and signs, e.g. `1`, `1.0` and `-0.0`, `0.0`
+    key = (type(value), repr(value))
+    c = _constants.get(key)
+    if c is None:
+        c = _constants[key] = Constant(value)
+    return c
+
+
 class Placeholder(Leaf, OperationsMixin):
-    def __init__(self, **kwargs):
+    """A leaf that is fed when the graph is run, `shape` and `dtype` are
+    optional and let the operations that use it infer their output statically,
+    a dimension of `shape` can be None, e.g. the batch dimension.
+
+    Example:
+        x = autograd.Placeholder(shape=(None, 3), dtype=np.float32)
+        out = autograd.matmul(x, autograd.Variable(np.ones((3, 2))))
+        out.static_shape  # (None, 2)
+    """
+    _declared = True
+    __slots__ = ('_assigned',)
+
+    def __init__(self, shape=None, dtype=None, **kwargs):
         super().__init__(data=None, **kwargs)
         self._assigned = False
+        self.static_shape = None if shape is None else tuple(shape)
+        self.dtype = None if dtype is None else np.dtype(dtype)
 
     @property
     def assigned(self):
@@ -69,9 +203,19 @@ class Placeholder(Leaf, OperationsMixin):
             raise PlaceholderNotAssignedError(f"{self} is not Assigned yet to a value.")
         return self._data
 
+    def validate(self, value, batched=False):
+        """Casts `value` to the dtype of the placeholder (the default dtype if it was
+        not declared, see `backend.as_array`) and checks its shape, `batched` values
+        have an extra leading batch axis"""
+        value = backend.as_array(value, self.dtype, copy=False)
+        shape = value.shape[1:] if batched else value.shape
+        if not shapes.compatible(shape, self.static_shape):
+            raise ShapeError(f"{self} expects a value of shape {self.static_shape}. Recieved shape: {shape}")
+        return value
+
     def assign(self, data):
         if data is None:
             raise ValueError("Cannot assign `None` to data.")
-        self._data = np.array(data)
+        self._data = self.validate(backend.as_array(data, self.dtype))
         self._assigned = True
         return self
@@ -0,0 +1 @@
+"""Benchmarks of the library, see `benchmarks.run` for the suite that reports JSON."""
@@ -0,0 +1,44 @@
+"""Measures the construction time and the memory per node of a large graph.
+The suite in `benchmarks.run` measures it too.
+
+Usage:
+    python benchmarks/graph_construction.py [num_nodes]
+"""
+import gc
+import sys
+import time
+import tracemalloc
+
+import autograd
+
+
+def build_chain(num_nodes):
+    x = autograd.Variable(1.0)
+    c = autograd.Variable(1.0)
+    node = x
+    for _ in range(num_nodes):
+        node = autograd.add(node, c)
+    return node
+
+
+def main(num_nodes=1_000_000):
+    gc.collect()
+    start = time.perf_counter()
+    graph = build_chain(num_nodes)
+    elapsed = time.perf_counter() - start
+    del graph
+    gc.collect()
+
+    tracemalloc.start()
+    graph = build_chain(num_nodes)
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del graph
+
+    print(f"nodes: {num_nodes}")
+    print(f"construction: {elapsed:.3f}s ({num_nodes / elapsed:,.0f} nodes/s)")
+    print(f"memory: {allocated / num_nodes:.1f} bytes/node")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
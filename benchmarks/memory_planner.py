@@ -0,0 +1,54 @@
+"""Reports the peak memory of a training step of a deep MLP run by a
+`Session` with and without `plan_memory`.
+The suite in `benchmarks.run` measures it too.
+
+Usage:
+    python benchmarks/memory_planner.py [depth] [width] [batch_size]
+"""
+import sys
+import tracemalloc
+
+import numpy as np
+
+import autograd
+
+
+def build_mlp(depth, width):
+    rng = np.random.default_rng(0)
+    # the buffer pool needs the static dtypes
+    x = autograd.Placeholder(shape=(None, width), dtype=np.float32)
+    weights = []
+    node = x
+    for _ in range(depth):
+        w = autograd.Variable(rng.normal(size=(width, width)) / np.sqrt(width))
+        weights.append(w)
+        node = autograd.relu(autograd.matmul(node, w))
+        node = autograd.exp(node * 0.5) - 1.0
+    return autograd.sum(node), x, weights
+
+
+def peak_bytes(loss, feed_dict, with_respect, **kwargs):
+    # two steps, so the arrays kept by the buffer pool between them are counted
+    tracemalloc.start()
+    session = autograd.Session(loss, **kwargs)
+    for _ in range(2):
+        session.run(feed_dict, with_respect=with_respect)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main(depth=32, width=256, batch_size=512):
+    loss, x, weights = build_mlp(depth, width)
+    feed_dict = {x: np.random.default_rng(1).normal(size=(batch_size, width))}
+
+    print(f"depth: {depth}, width: {width}, batch size: {batch_size}")
+    for fuse in (False, True):
+        before = peak_bytes(loss, feed_dict, weights, fuse=fuse)
+        after = peak_bytes(loss, feed_dict, weights, fuse=fuse, plan_memory=True)
+        print(f"fuse={fuse}: peak {before / 2**20:.1f} MiB -> {after / 2**20:.1f} MiB "
+              f"with plan_memory ({1 - after / before:.0%} less)")
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
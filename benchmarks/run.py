@@ -0,0 +1,104 @@
+"""Runs the benchmark suite and writes the results as JSON, see `benchmarks.suite`.
+
+Usage:
+    python -m benchmarks.run [--quick] [--filter NAME ...] [--output results.json]
+                             [--compare baseline.json] [--tolerance 0.1]
+
+With `--compare` the metrics that are worse than the baseline by more than
+`--tolerance` (a fraction) are reported and the exit status is 1.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.suite import BENCHMARKS
+
+
+def metadata(quick):
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+            cwd=Path(__file__).parent, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'system': platform.system(),
+        'quick': quick,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+
+def run(names, quick=False, log=sys.stderr):
+    results = {}
+    for name in names:
+        start = time.perf_counter()
+        results[name] = BENCHMARKS[name](quick=quick)
+        print(f"{name}: {time.perf_counter() - start:.1f}s", file=log)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Returns `(benchmark, metric, baseline value, value)` for every metric that got worse"""
+
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            previous = baseline.get(name, {}).get(metric)
+            if not previous:
+                continue
+            if metric.endswith('_per_sec'):
+                worse = value < previous * (1 - tolerance)
+            elif metric.endswith('_bytes'):
+                worse = value > previous * (1 + tolerance)
+            else:
+                continue
+            if worse:
+                regressions.append((name, metric, previous, value))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--quick', action='store_true', help='smaller sizes, for a smoke run')
+    parser.add_argument('--filter', nargs='+', default=None, help='run the benchmarks whose name contains one of these')
+    parser.add_argument('--output', default=None, help='the JSON file to write, stdout by default')
+    parser.add_argument('--compare', default=None, help='a JSON file written by a previous run')
+    parser.add_argument('--tolerance', type=float, default=0.1)
+    parser.add_argument('--list', action='store_true', help='list the benchmarks and exit')
+    args = parser.parse_args(argv)
+
+    names = [name for name in BENCHMARKS if args.filter is None or any(f in name for f in args.filter)]
+    if args.list:
+        print('\n'.join(names))
+        return 0
+
+    report = {'metadata': metadata(args.quick), 'benchmarks': run(names, quick=args.quick)}
+    output = json.dumps(report, indent=2)
+    if args.output is None:
+        print(output)
+    else:
+        Path(args.output).write_text(output + '\n')
+
+    if args.compare is not None:
+        baseline = json.loads(Path(args.compare).read_text())['benchmarks']
+        regressions = compare(report['benchmarks'], baseline, args.tolerance)
+        for name, metric, previous, value in regressions:
+            print(f"regression: {name} {metric}: {previous:.4g} -> {value:.4g}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,286 @@
+"""The benchmarks run by `benchmarks.run`, every benchmark takes `quick`
+(smaller sizes for a smoke run) and returns a flat dict of metrics. Rates end
+with `_per_sec` (higher is better) and memory with `_bytes` (lower is better).
+
+The inputs are seeded and every time is the best of a few repeats after a
+warm up run, so the results only change with the code and the machine.
+"""
+import functools
+import gc
+import time
+import tracemalloc
+
+import numpy as np
+
+import autograd
+from autograd import backend
+from benchmarks import graph_construction, memory_planner
+
+REPEAT = 5
+BENCHMARKS = {}
+
+
+def register(name, function=None):
+    if function is None:
+        return functools.partial(register, name)
+    BENCHMARKS[name] = function
+    return function
+
+
+def best_time(function, repeat=REPEAT):
+    function()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def peak_memory(function):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def _rerun(leaf, node):
+    # a write to the leaf invalidates the cached outputs
+    leaf._data = leaf._data
+    return node.forward()
+
+
+def _graph_metrics(num_ops, build, leaves):
+    """Construction, forward and backward rates of the graph built by `build()`
+    with `num_ops` operations, the forward is recomputed by writing `leaves[0]`"""
+
+    with np.errstate(all='ignore'):
+        construction = best_time(build)
+        node = build()
+        forward = best_time(lambda: _rerun(leaves[0], node))
+        backward = best_time(lambda: node.backward(leaves))
+        session = autograd.Session(node, fuse=False)
+        session_forward = best_time(session.run)
+        session_backward = best_time(lambda: session.run(with_respect=leaves))
+        peak = peak_memory(lambda: build().backward(leaves))
+    return {
+        'num_ops': num_ops,
+        'construction_ops_per_sec': num_ops / construction,
+        'forward_ops_per_sec': num_ops / forward,
+        'backward_ops_per_sec': num_ops / backward,
+        'session_forward_ops_per_sec': num_ops / session_forward,
+        'session_forward_backward_ops_per_sec': num_ops / session_backward,
+        'peak_memory_bytes': peak,
+    }
+
+
+# the operation applied to the previous node and a constant, and the
+# initial value, chosen so the chains do not overflow where possible
+PRIMITIVES = {
+    'add': (lambda node, c: autograd.add(node, c), 0.5),
+    'subtract': (lambda node, c: autograd.subtract(node, c), 0.5),
+    'multiply': (lambda node, c: autograd.multiply(node, c), 0.5),
+    'divide': (lambda node, c: autograd.divide(node, c), 0.5),
+    'power': (lambda node, c: autograd.power(node, 1), 0.5),
+    'dot': (lambda node, c: autograd.dot(node, c), 0.5),
+    'matmul': (lambda node, c: autograd.matmul(node, c), np.full((1, 1), 0.5)),
+    'sum': (lambda node, c: autograd.sum(node), 0.5),
+    'exp': (lambda node, c: autograd.exp(node), -10.),
+    'relu': (lambda node, c: autograd.relu(node), 0.5),
+    'sigmoid': (lambda node, c: autograd.sigmoid(node), 0.5),
+    'atomic_sigmoid': (lambda node, c: autograd.atomic_sigmoid(node), 0.5),
+    'sin': (lambda node, c: autograd.sin(node), 0.5),
+    'cos': (lambda node, c: autograd.cos(node), 0.5),
+    'sinh': (lambda node, c: autograd.sinh(node), 0.),
+    'cosh': (lambda node, c: autograd.cosh(node), 0.),
+}
+
+
+def primitive(op, quick=False):
+    """A chain of one primitive operation on scalars, measures the overhead per operation"""
+
+    apply, initial = PRIMITIVES[op]
+    num_ops = 200 if quick else 2_000
+    x = autograd.Variable(initial)
+    c = autograd.Variable(np.ones_like(initial))
+
+    def build():
+        node = x
+        for _ in range(num_ops):
+            node = apply(node, c)
+        return node
+
+    return _graph_metrics(num_ops, build, [x])
+
+
+for _op in PRIMITIVES:
+    register(f'primitive/{_op}', functools.partial(primitive, _op))
+
+
+@register('construction')
+def construction(quick=False):
+    num_nodes = 20_000 if quick else 200_000
+    elapsed = best_time(lambda: graph_construction.build_chain(num_nodes), repeat=3)
+    gc.collect()
+    tracemalloc.start()
+    graph = graph_construction.build_chain(num_nodes)
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del graph
+    return {
+        'num_nodes': num_nodes,
+        'construction_nodes_per_sec': num_nodes / elapsed,
+        'memory_per_node_bytes': allocated / num_nodes,
+    }
+
+
+def deep_chain(depth, quick=False):
+    """A chain of `depth` blocks of three operations, the depth scales the graph
+    without changing the size of the values"""
+
+    if quick:
+        depth //= 10
+    x = autograd.Variable(0.5)
+    w = autograd.Variable(0.9)
+
+    def build():
+        node = x
+        for _ in range(depth):
+            node = autograd.sin(node * w + 0.1)
+        return node
+
+    return _graph_metrics(3 * depth, build, [x, w])
+
+
+def wide_dag(width, quick=False):
+    """`width` independent branches of the same input reduced by a balanced tree of additions"""
+
+    if quick:
+        width //= 10
+    x = autograd.Variable(0.5)
+    weights = [autograd.Variable(w) for w in np.random.default_rng(0).normal(size=width)]
+
+    def build():
+        nodes = [autograd.relu(x * w) for w in weights]
+        while len(nodes) > 1:
+            pairs = [autograd.add(a, b) for a, b in zip(nodes[::2], nodes[1::2])]
+            nodes = pairs + nodes[len(pairs) * 2:]
+        return nodes[0]
+
+    return _graph_metrics(3 * width - 1, build, [x] + weights)
+
+
+for _size in (1_000, 10_000):
+    register(f'deep_chain/{_size}', functools.partial(deep_chain, _size))
+    register(f'wide_dag/{_size}', functools.partial(wide_dag, _size))
+
+
+class ScalarMLP:
+    """The per-scalar MLP of `simple_mlp.ipynb`"""
+
+    def __init__(self, nin, layer_dims, rng):
+        layer_dims = [nin] + layer_dims
+        self.w = [
+            [[autograd.Variable(rng.uniform(-0.1, 0.1)) for _ in range(layer_dims[i - 1])] for _ in range(layer_dims[i])]
+            for i in range(1, len(layer_dims))
+        ]
+        self.b = [autograd.Variable(rng.uniform(-0.1, 0.1)) for _ in range(len(layer_dims) - 1)]
+
+    @property
+    def weights(self):
+        return backend.flatten(self.w) + self.b
+
+    def __call__(self, x):
+        inputs = x
+        for i, (layer_weights, layer_bias) in enumerate(zip(self.w, self.b)):
+            outputs = []
+            for neuron_weights in layer_weights:
+                terms = [(w * inp) + layer_bias for w, inp in zip(neuron_weights, inputs)]
+                if i != len(self.w) - 1:
+                    terms = [autograd.relu(term) for term in terms]
+                outputs.append(sum(terms))
+            inputs = outputs
+        return inputs[0]
+
+
+@register('scalar_mlp')
+def scalar_mlp(quick=False):
+    """Training steps of the notebook's MLP on the OR gate, the graph is rebuilt every step"""
+
+    xs = [[0, 0], [0, 1], [1, 0], [1, 1]]
+    ys = [0, 1, 1, 1]
+    model = ScalarMLP(2, [5, 5, 1], np.random.default_rng(0))
+    weights = model.weights
+
+    def step():
+        loss = None
+        for x, y in zip(xs, ys):
+            error = (y - model(x)) ** 2
+            loss = error if loss is None else loss + error
+        loss = loss / len(ys)
+        loss.forward()
+        loss.backward(weights)
+        backend.sgd_update(weights, lr=0.01)
+
+    num_steps = 5 if quick else 50
+    elapsed = best_time(lambda: [step() for _ in range(num_steps)], repeat=3)
+    return {
+        'num_weights': len(weights),
+        'steps_per_sec': num_steps / elapsed,
+        'peak_memory_bytes': peak_memory(step),
+    }
+
+
+@register('batched_mlp')
+def batched_mlp(quick=False):
+    """Training steps of a matmul MLP run by a `Session` and updated by an `SGD` optimizer"""
+
+    batch_size, width, depth = (64, 64, 3) if quick else (256, 256, 4)
+    rng = np.random.default_rng(0)
+    x = autograd.Placeholder(shape=(None, width))
+    y = autograd.Placeholder(shape=(None, 1))
+    weights = []
+    node = x
+    for i in range(depth):
+        w = autograd.Variable(rng.normal(size=(width, 1 if i == depth - 1 else width)) / np.sqrt(width))
+        b = autograd.Variable(np.zeros(1 if i == depth - 1 else width))
+        weights += [w, b]
+        node = autograd.matmul(node, w) + b
+        if i != depth - 1:
+            node = autograd.relu(node)
+    error = node - y
+    loss = autograd.sum(error * error)
+    feed_dict = {x: rng.normal(size=(batch_size, width)), y: rng.normal(size=(batch_size, 1))}
+    session = autograd.Session(loss, fuse=False)
+    optimizer = autograd.SGD(weights, lr=1e-4, momentum=0.9)
+
+    def step():
+        session.run(feed_dict, with_respect=weights)
+        optimizer.step()
+
+    num_steps = 5 if quick else 20
+    elapsed = best_time(lambda: [step() for _ in range(num_steps)], repeat=3)
+    return {
+        'num_weights': int(sum(np.size(w.data) for w in weights)),
+        'steps_per_sec': num_steps / elapsed,
+        'examples_per_sec': num_steps * batch_size / elapsed,
+        'peak_memory_bytes': peak_memory(step),
+    }
+
+
+@register('memory_planner')
+def planned_memory(quick=False):
+    depth, width, batch_size = (8, 64, 64) if quick else (32, 256, 512)
+    loss, x, weights = memory_planner.build_mlp(depth, width)
+    feed_dict = {x: np.random.default_rng(1).normal(size=(batch_size, width))}
+    metrics = {}
+    for fuse in (False, True):
+        suffix = '_fused' if fuse else ''
+        metrics[f'peak_memory{suffix}_bytes'] = memory_planner.peak_bytes(loss, feed_dict, weights, fuse=fuse)
+        metrics[f'planned_peak_memory{suffix}_bytes'] = memory_planner.peak_bytes(
+            loss, feed_dict, weights, fuse=fuse, plan_memory=True)
+    return metrics